@@ -0,0 +1,329 @@
+# file: backtest.py
+import os
+import re
+import sys
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from collections import namedtuple
+from datetime import datetime, date, time as dt_time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import database
+import pricing
+import instrument_index
+
+# Replays archived screener results against local intraday bars, so profit/loss settings can be compared without
+# trading live. Baskets are sized and priced by the same pricing functions as a live run; exits are resolved on bar
+# highs and lows for every trade of every day at once.
+
+DEFAULT_ENTRY_TIME = dt_time(9, 15)
+DEFAULT_SQUARE_OFF = dt_time(15, 15)
+RESULTS_FILE = "backtest_results.csv"
+
+# Bar files are SYMBOL.csv with a timestamp column (or separate date and time columns) and these price columns.
+OHLC_COLUMNS = ["open", "high", "low", "close"]
+TIMESTAMP_COLUMNS = ["datetime", "timestamp", "date"]
+
+# Scan files carry their trading day in the name, e.g. 2024-05-10.csv or scan_20240510.csv.
+_DATE_PATTERN = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})")
+
+# How each trade ended.
+TARGET_HIT, STOP_HIT, SQUARED_OFF = 0, 1, 2
+
+# Every replayed trade, one row each, grouped by scan and in rank order within a scan. The bar arrays are padded with
+# NaN to the longest trade, so one grid point is a handful of array operations over the whole history.
+# Bars run from the entry bar (entry is its open) up to the square-off; exit_close is the close of the last of them.
+ReplayPanel = namedtuple("ReplayPanel", ["scan", "rank", "symbol", "entry", "tick", "lot_size", "opens", "highs", "lows", "exit_close",
+                                         "scan_times", "missing"])
+
+_worker_state = {}
+
+
+# --- Loading ---
+
+def load_scan_files(directory, entry_time=DEFAULT_ENTRY_TIME):
+    """Reads the archived Chartink CSVs in `directory`. Returns [(entered_at, symbols in scan order)] sorted by day."""
+    scans = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(".csv"):
+            continue
+        match = _DATE_PATTERN.search(name)
+        if not match:
+            print(f"Skipping {name}: no date in the file name.", file=sys.stderr)
+            continue
+        day = date(*(int(part) for part in match.groups()))
+        df = pd.read_csv(os.path.join(directory, name))
+        # Same column positions as get_data uses on a live scan.
+        symbols = df.iloc[:, 2].astype(str).tolist() if df.shape[1] > 2 else []
+        scans.append((datetime.combine(day, entry_time), symbols))
+    return sorted(scans)
+
+
+def load_scan_history(db_file=database.DB_FILE, link=None):
+    """Reads what live runs actually planned, one scan per run in rank order, entered when the plans were made.
+
+    The orders table is used rather than scan_results, because a polling run records the full scan on every
+    poll but only plans the hits it had not seen yet that day. The database is opened read-only.
+    """
+    if not os.path.exists(db_file):
+        return []
+    conn = sqlite3.connect(Path(db_file).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        sql = 'SELECT o.run_id, o.created_at, o.symbol FROM orders o'
+        params = ()
+        if link:
+            sql += ' JOIN runs r ON r.run_id = o.run_id WHERE r.link = ?'
+            params = (link,)
+        rows = conn.execute(sql + ' ORDER BY o.created_at, o.run_id, o.rank', params).fetchall()
+    finally:
+        conn.close()
+
+    scans = {}
+    for run_id, created_at, symbol in rows:
+        scans.setdefault(run_id, (datetime.fromtimestamp(created_at), []))[1].append(symbol)
+    return sorted(scans.values())
+
+
+def load_bars(directory, symbol):
+    """Reads DIRECTORY/SYMBOL.csv. Returns (timestamps, [open, high, low, close] rows) sorted by time, or None."""
+    path = os.path.join(directory, f"{symbol}.csv")
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path)
+    df.columns = [str(column).strip().lower() for column in df.columns]
+    if "date" in df.columns and "time" in df.columns:
+        stamps = pd.to_datetime(df["date"].astype(str) + " " + df["time"].astype(str))
+    else:
+        column = next((column for column in TIMESTAMP_COLUMNS if column in df.columns), df.columns[0])
+        stamps = pd.to_datetime(df[column])
+    stamps = stamps.to_numpy(dtype="datetime64[ns]")
+    order = np.argsort(stamps, kind="stable")
+    return stamps[order], df[OHLC_COLUMNS].to_numpy(dtype=float)[order]
+
+
+def build_panel(scans, ohlc_dir, max_stocks, square_off=DEFAULT_SQUARE_OFF, index=None):
+    """Cuts each scan's top `max_stocks` hits out of their bar files. Hits without bars for that session are skipped."""
+    bars = {}
+    rows = []
+    missing = 0
+    for scan, (entered_at, symbols) in enumerate(scans):
+        close_at = np.datetime64(datetime.combine(entered_at.date(), square_off))
+        for rank, symbol in enumerate(symbols[:max_stocks]):
+            if symbol not in bars:
+                bars[symbol] = load_bars(ohlc_dir, symbol)
+            if bars[symbol] is None:
+                missing += 1
+                continue
+            stamps, values = bars[symbol]
+            start = np.searchsorted(stamps, np.datetime64(entered_at))
+            end = np.searchsorted(stamps, close_at)
+            if start >= end:
+                missing += 1
+                continue
+            rows.append((scan, rank, symbol, values[start:end]))
+
+    width = max((len(values) for *_, values in rows), default=1)
+    opens, highs, lows = (np.full((len(rows), width), np.nan) for _ in range(3))
+    for row, (*_, values) in enumerate(rows):
+        opens[row, :len(values)] = values[:, 0]
+        highs[row, :len(values)] = values[:, 1]
+        lows[row, :len(values)] = values[:, 2]
+
+    symbols = [symbol for _, _, symbol, _ in rows]
+    instruments = [index.get(symbol) if index is not None else None for symbol in symbols]
+    return ReplayPanel(
+        scan=np.array([scan for scan, *_ in rows], dtype=np.int64),
+        rank=np.array([rank for _, rank, *_ in rows], dtype=np.int64),
+        symbol=symbols,
+        entry=opens[:, 0].copy(),
+        tick=np.array([instrument.tick_size if instrument else pricing.DEFAULT_TICK for instrument in instruments], dtype=float),
+        lot_size=np.array([instrument.lot_size if instrument else 1 for instrument in instruments], dtype=np.int64),
+        opens=opens,
+        highs=highs,
+        lows=lows,
+        exit_close=np.array([values[-1, 3] for *_, values in rows], dtype=float),
+        scan_times=[entered_at for entered_at, _ in scans],
+        missing=missing,
+    )
+
+
+# --- Replay ---
+
+def basket_quantities(panel, no_of_stocks, total_amount):
+    """Shares per trade when each scan buys its top `no_of_stocks` hits, sized by pricing.allocate as a live run is."""
+    quantity = np.zeros(len(panel.entry), dtype=np.int64)
+    if not no_of_stocks:
+        return quantity
+    amount_per_stock = total_amount / no_of_stocks
+    bounds = np.searchsorted(panel.scan, np.arange(len(panel.scan_times) + 1))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        # Ranks are ascending within a scan, so the picked hits are a prefix of its rows.
+        end = start + int(np.searchsorted(panel.rank[start:end], no_of_stocks))
+        if end > start:
+            quantity[start:end] = pricing.allocate(panel.entry[start:end], amount_per_stock, panel.lot_size[start:end])
+    return quantity
+
+
+def _first_true(hits):
+    """Column of the first True in each row, or the row width where there is none."""
+    rows = np.arange(hits.shape[0])
+    first = hits.argmax(axis=1)
+    return np.where(hits[rows, first], first, hits.shape[1])
+
+
+def simulate(panel, profit_percent, loss_percent):
+    """Resolves every trade for one profit/loss setting. Returns (exit prices, outcomes) per trade.
+
+    Stop and target are the Stop-Loss trigger and Target a live run would place. The first bar whose low reaches
+    the stop or whose high reaches the target closes the trade; a bar that opens beyond a level fills at its open.
+    A bar that spans both levels cannot tell which came first, so it is counted as the stop. Trades that touch
+    neither are squared off at the last close before the square-off time.
+    """
+    stop, _, target, _, _ = pricing.exit_levels(panel.entry, profit_percent, loss_percent, panel.tick)
+    width = panel.highs.shape[1]
+    rows = np.arange(len(stop))
+    first_stop = _first_true(panel.lows <= stop[:, None])
+    first_target = _first_true(panel.highs >= target[:, None])
+
+    stopped = (first_stop < width) & (first_stop <= first_target)
+    targeted = (first_target < width) & ~stopped
+    stop_fill = np.minimum(stop, panel.opens[rows, np.minimum(first_stop, width - 1)])
+    target_fill = np.maximum(target, panel.opens[rows, np.minimum(first_target, width - 1)])
+    exit_price = np.select([stopped, targeted], [stop_fill, target_fill], panel.exit_close)
+    outcome = np.select([stopped, targeted], [STOP_HIT, TARGET_HIT], SQUARED_OFF)
+    return exit_price, outcome
+
+
+def summarise(panel, quantity, exit_price, outcome, total_amount):
+    traded = quantity > 0
+    pnl = (exit_price - panel.entry) * quantity
+    per_scan = np.bincount(panel.scan, weights=pnl, minlength=len(panel.scan_times))
+    equity = np.concatenate(([0.0], np.cumsum(per_scan)))
+    trades = int(traded.sum())
+    return {
+        "trades": trades,
+        "targets": int((traded & (outcome == TARGET_HIT)).sum()),
+        "stops": int((traded & (outcome == STOP_HIT)).sum()),
+        "squared_off": int((traded & (outcome == SQUARED_OFF)).sum()),
+        "win_rate": float((pnl[traded] > 0).mean() * 100) if trades else 0.0,
+        "pnl": float(pnl.sum()),
+        "return_percent": float(pnl.sum() / total_amount * 100) if total_amount else 0.0,
+        "max_drawdown": float((np.maximum.accumulate(equity) - equity).max()),
+    }
+
+
+def _init_worker(panel, quantities, total_amount):
+    _worker_state.update(panel=panel, quantities=quantities, total_amount=total_amount)
+
+
+def _evaluate(point):
+    no_of_stocks, profit_percent, loss_percent = point
+    panel = _worker_state["panel"]
+    exit_price, outcome = simulate(panel, profit_percent, loss_percent)
+    result = {"no_of_stocks": no_of_stocks, "profit_percent": profit_percent, "loss_percent": loss_percent}
+    result.update(summarise(panel, _worker_state["quantities"][no_of_stocks], exit_price, outcome, _worker_state["total_amount"]))
+    return result
+
+
+def run_grid(panel, total_amount, stocks, profits, losses, workers=None):
+    """Evaluates every (no_of_stocks, profit_percent, loss_percent) combination, spread over `workers` processes.
+
+    The panel and the basket sizes (which do not depend on profit/loss) are built once and sent to each worker
+    when it starts, so a grid point only costs its own array passes.
+    """
+    quantities = {no_of_stocks: basket_quantities(panel, no_of_stocks, total_amount) for no_of_stocks in stocks}
+    grid = [(no_of_stocks, profit, loss) for no_of_stocks in stocks for profit in profits for loss in losses]
+    workers = min(workers or os.cpu_count() or 1, len(grid))
+    if workers <= 1:
+        _init_worker(panel, quantities, total_amount)
+        return [_evaluate(point) for point in grid]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(panel, quantities, total_amount)) as pool:
+        return list(pool.map(_evaluate, grid, chunksize=max(1, len(grid) // (workers * 4))))
+
+
+# --- Command line ---
+
+def parse_grid(text):
+    """'1.5', '1,1.5,2' or 'start:stop:step' (stop included) as a list of floats."""
+    values = []
+    for part in text.split(","):
+        if ":" in part:
+            start, stop, step = (float(value) for value in part.split(":"))
+            if step <= 0:
+                raise ValueError("step must be positive")
+            values.extend(np.round(np.arange(start, stop + step / 2, step), 6).tolist())
+        else:
+            values.append(float(part))
+    return values
+
+
+def parse_stock_grid(text):
+    return [int(value) for value in parse_grid(text)]
+
+
+def print_results(results, top, out=sys.stdout):
+    print(f"{'stocks':>6} {'profit%':>8} {'loss%':>6} {'trades':>7} {'target':>7} {'stop':>6} {'sq.off':>7} {'win%':>6} "
+          f"{'P&L':>12} {'return%':>8} {'max DD':>10}", file=out)
+    for r in results[:top]:
+        print(f"{r['no_of_stocks']:>6} {r['profit_percent']:>8.2f} {r['loss_percent']:>6.2f} {r['trades']:>7} {r['targets']:>7} "
+              f"{r['stops']:>6} {r['squared_off']:>7} {r['win_rate']:>6.1f} {r['pnl']:>12.2f} {r['return_percent']:>8.2f} "
+              f"{r['max_drawdown']:>10.2f}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay archived screener results against intraday bars over a grid of settings.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--scans", help="folder of archived Chartink scan CSVs, one per trading day with the date in the file name")
+    source.add_argument("--db", help="replay the stocks live runs planned, from this database (e.g. user_data.db)")
+    parser.add_argument("--link", help="with --db, only the scans of this screener link")
+    parser.add_argument("--ohlc", required=True, help="folder of intraday bars, one SYMBOL.csv per stock")
+    parser.add_argument("--total-amount", type=float, required=True, help="capital per scan, as in the app")
+    parser.add_argument("--stocks", type=parse_stock_grid, required=True, help="number of stocks per scan, e.g. 5 or 2,3,5")
+    parser.add_argument("--profit", type=parse_grid, required=True, help="profit %% values, e.g. 1.5, 1,1.5,2 or 0.5:3:0.25")
+    parser.add_argument("--loss", type=parse_grid, required=True, help="loss %% values, same forms as --profit")
+    parser.add_argument("--entry-time", type=dt_time.fromisoformat, default=DEFAULT_ENTRY_TIME,
+                        help="entry time for --scans files (HH:MM[:SS]); --db runs enter when their orders were planned")
+    parser.add_argument("--square-off", type=dt_time.fromisoformat, default=DEFAULT_SQUARE_OFF, help="time open trades are closed")
+    parser.add_argument("--workers", type=int, default=None, help="processes for the grid (default: one per CPU)")
+    parser.add_argument("--top", type=int, default=20, help="rows to print, best P&L first")
+    parser.add_argument("--output", default=RESULTS_FILE, help="CSV file for every grid point ('' to skip)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.scans:
+        scans = load_scan_files(args.scans, args.entry_time)
+    else:
+        scans = load_scan_history(args.db, args.link)
+    if not scans:
+        print("No scans to replay.", file=sys.stderr)
+        return 1
+    try:
+        index = instrument_index.load_index()
+    except FileNotFoundError:
+        index = None
+        print(f"{instrument_index.CSV_FILE} not found: using a {pricing.DEFAULT_TICK} tick and lot size 1 for every stock.", file=sys.stderr)
+    panel = build_panel(scans, args.ohlc, max(args.stocks), args.square_off, index)
+    load_s = time.perf_counter() - start
+    print(f"Loaded {len(scans)} scans, {len(panel.entry)} trades ({panel.missing} hits without bars) in {load_s:.2f} s.")
+    if not len(panel.entry):
+        return 1
+
+    start = time.perf_counter()
+    results = run_grid(panel, args.total_amount, args.stocks, args.profit, args.loss, args.workers)
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda r: r["pnl"], reverse=True)
+    print(f"Replayed {len(results)} settings in {elapsed:.2f} s ({len(results) / max(elapsed, 1e-6):.0f} settings/s).\n")
+    print_results(results, args.top)
+    if args.output:
+        pd.DataFrame(results).to_csv(args.output, index=False)
+        print(f"\nAll results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
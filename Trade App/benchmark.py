@@ -0,0 +1,133 @@
+# file: benchmark.py
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import tracemalloc
+import subprocess
+
+import database
+import tracing
+import log_sink
+import order_engine
+import trading_logic
+import mock_servers
+
+# Drives the full trading pipeline against the local Chartink and DhanHQ stand-ins, so performance can be
+# measured and compared between changes without live accounts or a browser.
+
+DEFAULT_SIZES = [1, 10, 50, 200]
+RESULTS_FILE = "benchmark_results.jsonl"
+
+BENCH_CLIENT_ID = "1000000001"
+BENCH_ACCESS_TOKEN = "benchmark-token"
+
+# Enough capital that every sampled stock (priced up to 2,500) gets at least one share.
+CAPITAL_PER_SYMBOL = 10_000
+
+
+def _leg_latencies(tracer):
+    legs = {}
+    for span in tracer.spans:
+        if span.symbol is not None and span.name.startswith("order."):
+            legs.setdefault(span.name[len("order."):], []).append(span.duration_ms)
+    return {
+        leg: {"count": len(values), "p50_ms": tracing.percentile(values, 50), "p99_ms": tracing.percentile(values, 99)}
+        for leg, values in legs.items()
+    }
+
+
+def run_case(symbols, args):
+    """Runs one pre-armed execution for `symbols` scan hits and returns its measurements."""
+    rows = mock_servers.sample_scan_rows(symbols, seed=symbols)
+    chartink_server = mock_servers.MockChartinkServer(rows, latency=args.scan_latency_ms / 1000)
+    dhan_server = mock_servers.MockDhanServer(latency=args.broker_latency_ms / 1000, failure_rate=args.failure_rate,
+                                              orders_per_second=args.broker_rate_limit, seed=symbols,
+                                              prices=mock_servers.quote_prices(rows, seed=symbols), order_feed=True)
+    sink = log_sink.LogSink(log_file=None)
+    with chartink_server, dhan_server:
+        prepared = trading_logic.prearm(chartink_server.screener_link, BENCH_CLIENT_ID, BENCH_ACCESS_TOKEN, sink,
+                                        warm_connections=min(symbols, args.max_in_flight), broker_url=dhan_server.base_url,
+                                        order_feed_url=dhan_server.order_feed_url)
+        prearm_ms = prepared.tracer.total_ms(tracing.PREARM_PREFIX)
+        tracer = prepared.tracer
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        trading_logic.run_trading_script(chartink_server.screener_link, symbols * CAPITAL_PER_SYMBOL, 1.5, 1.0, symbols,
+                                         BENCH_CLIENT_ID, BENCH_ACCESS_TOKEN, sink, prepared=prepared,
+                                         max_in_flight=args.max_in_flight, orders_per_second=args.orders_per_second,
+                                         bracket_mode=args.bracket_mode)
+        end_to_end = time.perf_counter() - start
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        orders = sum(1 for span in tracer.spans if span.name.startswith("order."))
+        orders_span = next((span.duration_ms for span in tracer.spans if span.name == "orders"), 0.0)
+        return {
+            "symbols": symbols,
+            "prearm_ms": prearm_ms,
+            "end_to_end_ms": end_to_end * 1000,
+            "scan_ms": sum(span.duration_ms for span in tracer.spans if span.name in ("scan", "csv_parse")),
+            "quote_ms": sum(span.duration_ms for span in tracer.spans if span.name == "quote"),
+            "orders": orders,
+            "orders_per_second": orders / (orders_span / 1000) if orders_span else 0.0,
+            "accepted": len(dhan_server.orders),
+            "rejected": dhan_server.rejected,
+            "rate_limited": dhan_server.rate_limited,
+            "memory_peak_mb": peak_bytes / 1024 / 1024,
+            "legs": _leg_latencies(tracer),
+        }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the trading pipeline against local mock servers.")
+    parser.add_argument("--symbols", type=int, nargs="+", default=DEFAULT_SIZES, help="scan sizes to run")
+    parser.add_argument("--scan-latency-ms", type=float, default=150, help="mock Chartink response delay")
+    parser.add_argument("--broker-latency-ms", type=float, default=40, help="mock DhanHQ response delay")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of orders the mock broker rejects")
+    parser.add_argument("--broker-rate-limit", type=int, default=order_engine.DHAN_ORDERS_PER_SECOND,
+                        help="orders per second the mock broker accepts before answering 429")
+    parser.add_argument("--orders-per-second", type=float, default=order_engine.DHAN_ORDERS_PER_SECOND,
+                        help="client-side rate limit used by the order engine")
+    parser.add_argument("--max-in-flight", type=int, default=order_engine.DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--bracket-mode", action="store_true", help="use single-request bracket orders where allowed")
+    parser.add_argument("--output", default=RESULTS_FILE, help="JSON-lines file the results are appended to")
+    args = parser.parse_args(argv)
+
+    # Keep benchmark runs out of the real run history.
+    database.DB_FILE = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+
+    results = []
+    for symbols in args.symbols:
+        result = run_case(symbols, args)
+        results.append(result)
+        legs = ", ".join(f"{leg} p50 {stats['p50_ms']:.1f}/p99 {stats['p99_ms']:.1f} ms" for leg, stats in sorted(result["legs"].items()))
+        print(f"{symbols:>4} symbols: end-to-end {result['end_to_end_ms']:>8.0f} ms, "
+              f"{result['orders_per_second']:>5.1f} orders/s, peak {result['memory_peak_mb']:.1f} MB, "
+              f"{result['rate_limited']} rate-limited, {result['rejected']} rejected | {legs}")
+
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("symbols", "output")},
+        "results": results,
+    }
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# file: broker.py
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dhanhq.dhanhq import dhanhq
+
+# Upper bound on simultaneously open keep-alive connections to the broker per account.
+DEFAULT_POOL_SIZE = 16
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def is_rejection(response):
+    """True only when the broker answered an order with a 4xx error body, i.e. the order certainly does not exist.
+
+    dhanhq also reports timeouts, dropped connections and 5xx replies as "failure"; such an order may
+    still have reached the exchange.
+    """
+    if not response or response.get("status") == "success":
+        return False
+    status = response.get("http_status")
+    remarks = response.get("remarks")
+    return (status is not None and 400 <= status < 500 and isinstance(remarks, dict)
+            and bool(remarks.get("error_code") or remarks.get("error_type")))
+
+
+class BrokerGateway:
+    """A single dhanhq client per account whose HTTP session keeps a pool of warm connections.
+
+    requests/urllib3 connection pools are thread-safe, so every order thread shares this one object
+    instead of building its own client and paying a fresh TLS handshake per order.
+    """
+
+    def __init__(self, client_id, access_token, pool_size=DEFAULT_POOL_SIZE, base_url=None):
+        self.pool_size = pool_size
+        # pool_block makes a thread wait for a free warm connection instead of opening a throwaway one.
+        self.dhan = dhanhq(client_id, access_token, pool={"pool_connections": 1, "pool_maxsize": pool_size, "pool_block": True})
+        if base_url:
+            self.dhan.base_url = base_url.rstrip("/")
+            # dhanhq only mounts its pooled adapter for https; a local stand-in broker is plain http.
+            self.dhan.session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True))
+        # dhanhq drops the HTTP status; a response hook runs on the calling thread, so a thread-local can carry it back.
+        self._last_status = threading.local()
+        self.dhan.session.hooks["response"].append(self._remember_status)
+
+    def _remember_status(self, response, *args, **kwargs):
+        self._last_status.code = response.status_code
+
+    def _place_order(self, **kwargs):
+        """dhanhq's place_order, with the reply's HTTP status (None if no reply arrived) added as "http_status"."""
+        self._last_status.code = None
+        response = self.dhan.place_order(**kwargs)
+        if isinstance(response, dict):
+            response["http_status"] = self._last_status.code
+        return response
+
+    def warm(self, connections=1):
+        """Validates the token and opens up to `connections` keep-alive connections. Returns the first response."""
+        connections = max(1, min(connections, self.pool_size))
+        if connections == 1:
+            return self.dhan.get_fund_limits()
+        # Concurrent calls force the pool to open one socket each; they stay idle in the pool afterwards.
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            responses = list(executor.map(lambda _: self.dhan.get_fund_limits(), range(connections)))
+        return responses[0]
+
+    def place_buy(self, security_id, quantity):
+        return self._place_order(
+            security_id=security_id,
+            exchange_segment=self.dhan.NSE,
+            transaction_type=self.dhan.BUY,
+            quantity=quantity,
+            order_type=self.dhan.MARKET,
+            product_type=self.dhan.INTRA,
+            price=0
+        )
+
+    def place_stop_loss(self, security_id, quantity, trigger_price, price):
+        return self._place_order(
+            security_id=security_id,
+            exchange_segment=self.dhan.NSE,
+            transaction_type=self.dhan.SELL,
+            quantity=quantity,
+            order_type=self.dhan.SL,
+            product_type=self.dhan.INTRA,
+            price=price,
+            trigger_price=trigger_price
+        )
+
+    def place_target(self, security_id, quantity, price):
+        return self._place_order(
+            security_id=security_id,
+            exchange_segment=self.dhan.NSE,
+            transaction_type=self.dhan.SELL,
+            quantity=quantity,
+            order_type=self.dhan.LIMIT,
+            product_type=self.dhan.INTRA,
+            price=price
+        )
+
+    def place_bracket(self, security_id, quantity, profit_value, stop_loss_value):
+        """Places entry, target and stop in one request. The values are price distances from the fill."""
+        return self._place_order(
+            security_id=security_id,
+            exchange_segment=self.dhan.NSE,
+            transaction_type=self.dhan.BUY,
+            quantity=quantity,
+            order_type=self.dhan.MARKET,
+            product_type=self.dhan.BO,
+            price=0,
+            bo_profit_value=profit_value,
+            bo_stop_loss_Value=stop_loss_value
+        )
+
+    def last_prices(self, security_ids, timeout=None):
+        """Fetches the last traded price of every NSE equity in one /marketfeed/ltp request.
+
+        Returns {security_id: price}; instruments the feed does not quote are left out. Network and
+        HTTP errors are raised as requests exceptions.
+        """
+        # dhanhq.ticker_data uses the client-wide 60 s timeout, too slow for a pre-trade quote.
+        payload = {"NSE_EQ": [int(security_id) for security_id in security_ids]}
+        response = self.dhan.session.post(f"{self.dhan.base_url}/marketfeed/ltp", data=json.dumps(payload), timeout=timeout,
+                                          headers=dict(self.dhan.header, **{"client-id": self.dhan.client_id}))
+        response.raise_for_status()
+        quotes = (response.json().get("data") or {}).get("NSE_EQ") or {}
+        return {str(security_id): float(quote["last_price"]) for security_id, quote in quotes.items() if quote.get("last_price")}
+
+    def cancel_order(self, order_id):
+        return self.dhan.cancel_order(order_id)
+
+    def close(self):
+        self.dhan.session.close()
+
+
+def get_gateway(client_id, access_token, pool_size=DEFAULT_POOL_SIZE, base_url=None):
+    """Returns the app-wide gateway for an account, creating it on first use."""
+    key = (str(client_id), access_token, base_url)
+    with _gateways_lock:
+        gateway = _gateways.get(key)
+        if gateway is None or gateway.pool_size < pool_size:
+            gateway = BrokerGateway(client_id, access_token, pool_size, base_url)
+            _gateways[key] = gateway
+        return gateway
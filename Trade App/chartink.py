@@ -0,0 +1,155 @@
+# file: chartink.py
+import io
+import re
+import json
+import html
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+import pandas as pd
+
+# Column layout of the CSV that the Chartink "CSV" button downloads; get_data indexes into it by position.
+CSV_COLUMNS = ["Sr.", "Stock Name", "Symbol", "Links", "% Chg", "Price", "Volume"]
+
+# Keys of the rows returned by the /screener/process endpoint, in CSV_COLUMNS order ("Links" has no JSON counterpart).
+JSON_FIELDS = ["sr", "name", "nsecode", None, "per_chg", "close", "volume"]
+
+DEFAULT_TIMEOUT = 10
+# Connections kept open to chartink.com, shared by the sessions of every screener link.
+POOL_SIZE = 8
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+_CSRF_PATTERN = re.compile(r'<meta\s+name="csrf-token"\s+content="([^"]+)"', re.IGNORECASE)
+_SCAN_CLAUSE_PATTERNS = [
+    re.compile(r'name="scan_clause"[^>]*\bvalue="([^"]*)"', re.IGNORECASE),
+    re.compile(r'<textarea[^>]*name="scan_clause"[^>]*>(.*?)</textarea>', re.IGNORECASE | re.DOTALL),
+    re.compile(r'scan-clause="([^"]*)"', re.IGNORECASE),
+    re.compile(r'"scan_clause"\s*:\s*("(?:[^"\\]|\\.)*")'),
+]
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+# Cookies and CSRF tokens stay per link; only the TCP/TLS connections are pooled across links.
+_pool = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+
+
+class ChartinkError(Exception):
+    """Raised when the screener cannot be fetched over plain HTTP."""
+
+
+class ChartinkSession:
+    """A persistent HTTP session for one Chartink screener link (cookies, CSRF token and scan clause)."""
+
+    def __init__(self, link, timeout=DEFAULT_TIMEOUT):
+        self.link = link
+        self.timeout = timeout
+        parts = urlsplit(link)
+        self.process_url = urlunsplit((parts.scheme, parts.netloc, "/screener/process", "", ""))
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        self.session.mount("https://", _pool)
+        self.session.mount("http://", _pool)
+        self.csrf_token = None
+        self.scan_clause = None
+        self._lock = threading.Lock()
+
+    def prepare(self):
+        """Loads the screener page once to pick up the session cookie, CSRF token and scan clause."""
+        try:
+            response = self.session.get(self.link, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise ChartinkError(f"could not load screener page: {e}") from e
+
+        page = response.text
+        match = _CSRF_PATTERN.search(page)
+        if not match:
+            raise ChartinkError("CSRF token not found on screener page")
+        self.csrf_token = match.group(1)
+        self.scan_clause = _extract_scan_clause(page)
+        if not self.scan_clause:
+            raise ChartinkError("scan clause not found on screener page")
+
+    def fetch(self):
+        """Runs the scan and returns the results as a DataFrame shaped like the downloaded CSV."""
+        return parse_scan_response(*self.fetch_raw())
+
+    def fetch_raw(self):
+        """Runs the scan and returns the unparsed (body, content type) of the response."""
+        with self._lock:
+            if self.csrf_token is None:
+                self.prepare()
+            response = self._post_scan()
+            # Laravel answers 419 once the CSRF token has expired; refresh it and retry once.
+            if response.status_code == 419:
+                self.prepare()
+                response = self._post_scan()
+
+        if response.status_code != 200:
+            raise ChartinkError(f"scan request failed with HTTP {response.status_code}")
+        return response.content, response.headers.get("Content-Type", "")
+
+    def close(self):
+        # Session.close() would also close the shared pool under every other link, so only this link's state goes.
+        self.session.cookies.clear()
+        self.csrf_token = None
+
+    def _post_scan(self):
+        headers = {
+            "X-CSRF-TOKEN": self.csrf_token,
+            "X-Requested-With": "XMLHttpRequest",
+            "Referer": self.link,
+        }
+        try:
+            return self.session.post(self.process_url, data={"scan_clause": self.scan_clause}, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ChartinkError(f"scan request failed: {e}") from e
+
+
+def _extract_scan_clause(page):
+    for pattern in _SCAN_CLAUSE_PATTERNS:
+        match = pattern.search(page)
+        if not match:
+            continue
+        value = match.group(1)
+        if value.startswith('"'):
+            value = json.loads(value)
+        return html.unescape(value).strip()
+    return None
+
+
+def parse_scan_response(content, content_type=""):
+    """Parses a JSON or CSV scan response in memory into a DataFrame with CSV_COLUMNS.
+
+    Any reply that cannot be read as a scan raises ChartinkError, so callers can fall back to the browser.
+    """
+    if "csv" in content_type.lower():
+        try:
+            df = pd.read_csv(io.BytesIO(content))
+        except ValueError as e:  # includes pandas' EmptyDataError and ParserError
+            raise ChartinkError(f"unreadable CSV scan response: {e}") from e
+        if df.shape[1] < len(CSV_COLUMNS):
+            raise ChartinkError(f"unexpected CSV scan response with columns {list(df.columns)}")
+        return df
+
+    try:
+        payload = json.loads(content)
+    except ValueError as e:
+        raise ChartinkError(f"unexpected scan response: {e}") from e
+    if not isinstance(payload, dict) or not isinstance(payload.get("data"), list) \
+            or not all(isinstance(row, dict) for row in payload["data"]):
+        raise ChartinkError(f"unexpected scan response: {str(payload)[:200]}")
+
+    rows = [[row.get(field) if field else None for field in JSON_FIELDS] for row in payload["data"]]
+    return pd.DataFrame(rows, columns=CSV_COLUMNS)
+
+
+def get_session(link):
+    """Returns the shared ChartinkSession for a link, creating it on first use."""
+    with _sessions_lock:
+        session = _sessions.get(link)
+        if session is None:
+            session = ChartinkSession(link)
+            _sessions[link] = session
+        return session
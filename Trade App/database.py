@@ -1,42 +1,378 @@
 # file: database.py
-import sqlite3
 import os
+import math
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from itertools import groupby
 
 DB_FILE = "user_data.db"
 
-def init_db():
-    """Initializes the database and creates the credentials table if it doesn't exist."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
+# Writes queued while the writer is busy are committed together, up to this many statements per transaction.
+MAX_BATCH = 5000
+
+# While another connection holds the write lock, a batch is retried with this backoff (seconds) rather than dropped.
+LOCK_RETRY_DELAY = 0.05
+MAX_LOCK_RETRY_DELAY = 1.0
+
+SCHEMA = [
+    '''
         CREATE TABLE IF NOT EXISTS credentials (
             id INTEGER PRIMARY KEY,
             client_id TEXT NOT NULL,
             access_token TEXT NOT NULL
         )
-    ''')
-    conn.commit()
-    conn.close()
+    ''',
+    # Extra broker accounts, by name, that strategies can be routed to; credentials (id 1) stays the default account.
+    '''
+        CREATE TABLE IF NOT EXISTS accounts (
+            name TEXT PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            access_token TEXT NOT NULL
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            started_at REAL NOT NULL,
+            link TEXT,
+            status TEXT,
+            trigger_error_ms REAL
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS spans (
+            run_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            symbol TEXT,
+            start_ms REAL NOT NULL,
+            duration_ms REAL NOT NULL
+        )
+    ''',
+    # Every hit of a scan, in Chartink's order, whether or not it was traded.
+    '''
+        CREATE TABLE IF NOT EXISTS scan_results (
+            run_id TEXT NOT NULL,
+            captured_at REAL NOT NULL,
+            rank INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            name TEXT,
+            price REAL
+        )
+    ''',
+    # One row per planned position; its broker orders are in legs.
+    '''
+        CREATE TABLE IF NOT EXISTS orders (
+            run_id TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            rank INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            security_id TEXT,
+            quantity INTEGER NOT NULL,
+            price REAL,
+            stop_trigger REAL,
+            stop_limit REAL,
+            target REAL,
+            bracket INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (run_id, symbol)
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS legs (
+            run_id TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            leg TEXT NOT NULL,
+            order_id TEXT,
+            placed_at REAL NOT NULL,
+            latency_ms REAL,
+            status TEXT,
+            traded_quantity INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL
+        )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_runs_started_at ON runs (started_at)',
+    'CREATE INDEX IF NOT EXISTS idx_spans_run_id ON spans (run_id)',
+    'CREATE INDEX IF NOT EXISTS idx_scan_results_run_id ON scan_results (run_id)',
+    'CREATE INDEX IF NOT EXISTS idx_scan_results_captured_at ON scan_results (captured_at)',
+    'CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_orders_symbol ON orders (symbol, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_legs_run_id ON legs (run_id, symbol)',
+    'CREATE INDEX IF NOT EXISTS idx_legs_order_id ON legs (order_id)',
+]
+
+# Statements used on the hot path are fixed strings so sqlite3's statement cache compiles each one once.
+INSERT_RUN = 'INSERT OR REPLACE INTO runs (run_id, started_at, link, status, trigger_error_ms) VALUES (?, ?, ?, ?, ?)'
+INSERT_SPAN = 'INSERT INTO spans (run_id, name, symbol, start_ms, duration_ms) VALUES (?, ?, ?, ?, ?)'
+INSERT_SCAN_RESULT = 'INSERT INTO scan_results (run_id, captured_at, rank, symbol, name, price) VALUES (?, ?, ?, ?, ?, ?)'
+INSERT_ORDER = '''
+    INSERT OR REPLACE INTO orders (run_id, created_at, rank, symbol, security_id, quantity, price, stop_trigger, stop_limit, target, bracket)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+INSERT_LEG = '''
+    INSERT INTO legs (run_id, symbol, leg, order_id, placed_at, latency_ms, status, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+UPDATE_LEG = 'UPDATE legs SET status = ?, traded_quantity = ?, updated_at = ? WHERE order_id = ?'
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class Store:
+    """The app's SQLite database behind one long-lived WAL-mode writer connection.
+
+    Record calls only put rows on a queue; a background thread commits whatever has queued up as one
+    transaction, so order threads never wait on the disk. Reads use their own connection, which WAL
+    lets run alongside the writer.
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self.last_error = None  # the latest statement the writer had to drop
+        self.dropped = 0
+        self._queue = queue.SimpleQueue()
+        self._closing = threading.Event()
+        self._read_lock = threading.Lock()
+
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self._reader.execute('PRAGMA journal_mode=WAL')  # persistent: stored in the database file
+        with self._reader:
+            for statement in SCHEMA:
+                self._reader.execute(statement)
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    # --- Writing ---
+
+    def write(self, sql, params=()):
+        """Queues one statement."""
+        self._queue.put((sql, params))
+
+    def write_many(self, sql, rows):
+        """Queues one statement for each row."""
+        for params in rows:
+            self._queue.put((sql, params))
+
+    def execute(self, sql, params=()):
+        """Runs one write right away on the caller's thread and raises on failure, for writes the user waits on."""
+        with self._read_lock, self._reader:
+            self._reader.execute(sql, params)
+
+    def flush(self, timeout=None):
+        """Blocks until everything queued so far is committed. Returns False on timeout."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._writer.is_alive():
+            self.flush(5)
+            self._closing.set()  # a writer still waiting on a lock gives up instead of blocking the exit
+            self._queue.put(None)
+            self._writer.join(5)
+        self._reader.close()
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.path, cached_statements=256)
+        conn.execute('PRAGMA synchronous=NORMAL')  # with WAL, a crash can lose the last commits but never corrupts
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < MAX_BATCH:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            statements = [item for item in batch if isinstance(item, tuple)]
+            if statements:
+                self._commit(conn, statements)
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is None for item in batch):
+                conn.close()
+                return
+
+    def _commit(self, conn, statements):
+        delay = LOCK_RETRY_DELAY
+        while True:
+            try:
+                with conn:
+                    # Consecutive rows for the same statement go through one executemany call.
+                    for sql, group in groupby(statements, key=lambda item: item[0]):
+                        conn.executemany(sql, [params for _, params in group])
+                return
+            except sqlite3.OperationalError as e:
+                if not _is_locked(e) or self._closing.is_set():
+                    break
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_LOCK_RETRY_DELAY)
+            except sqlite3.Error:
+                break
+
+        # One bad statement rolled the batch back; commit the rest one at a time so only that row is lost.
+        for sql, params in statements:
+            try:
+                with conn:
+                    conn.execute(sql, params)
+            except sqlite3.Error as e:
+                self.last_error = e
+                self.dropped += 1
+
+    # --- Recording ---
+
+    def save_run(self, tracer, status):
+        """Stores one execution and all of its latency spans."""
+        self.write(INSERT_RUN, (tracer.run_id, tracer.started_at, tracer.attributes.get("link"), status,
+                                tracer.attributes.get("trigger_error_ms")))
+        self.write_many(INSERT_SPAN, [(tracer.run_id, span.name, span.symbol, span.start_ms, span.duration_ms) for span in tracer.spans])
+
+    def record_scan(self, run_id, symbols, names, prices):
+        now = time.time()
+        self.write_many(INSERT_SCAN_RESULT, [(run_id, now, rank, str(symbol), str(name), _price_or_none(price))
+                                             for rank, (symbol, name, price) in enumerate(zip(symbols, names, prices))])
+
+    def record_plans(self, run_id, plans):
+        now = time.time()
+        self.write_many(INSERT_ORDER, [
+            (run_id, now, plan.rank, plan.symbol, str(plan.security_id), plan.quantity, plan.price, plan.stop_trigger,
+             plan.stop_limit, plan.target, int(plan.bracket_profit is not None))
+            for plan in plans
+        ])
+
+    def record_leg(self, run_id, symbol, leg, order_id, latency_ms, status):
+        now = time.time()
+        self.write(INSERT_LEG, (run_id, symbol, leg, order_id, now, latency_ms, status, now))
+
+    def update_leg(self, order_id, status, traded_quantity):
+        self.write(UPDATE_LEG, (status, traded_quantity, time.time(), str(order_id)))
+
+    # --- Reading ---
+
+    def query(self, sql, params=()):
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def get_run_history(self, limit=20):
+        """Returns the most recent runs, newest first, each with its spans in recording order."""
+        runs = [
+            {"run_id": run_id, "started_at": started_at, "link": link, "status": status, "trigger_error_ms": trigger_error_ms}
+            for run_id, started_at, link, status, trigger_error_ms in self.query(
+                'SELECT run_id, started_at, link, status, trigger_error_ms FROM runs ORDER BY started_at DESC LIMIT ?', (limit,))
+        ]
+        for run in runs:
+            run["spans"] = self.query('SELECT name, symbol, start_ms, duration_ms FROM spans WHERE run_id = ? ORDER BY start_ms',
+                                      (run["run_id"],))
+        return runs
+
+    def get_day_report(self, day):
+        """Per-symbol totals for every position opened on `day` (a datetime.date), in the order they were planned."""
+        start = time.mktime(day.timetuple())
+        end = start + 24 * 60 * 60
+        rows = self.query('''
+            SELECT o.symbol, o.quantity, o.price, o.quantity * o.price,
+                   COUNT(l.rowid),
+                   SUM(l.order_id IS NULL),
+                   SUM(l.status = 'TRADED'),
+                   SUM(l.status = 'CANCELLED'),
+                   AVG(l.latency_ms)
+            FROM orders o LEFT JOIN legs l ON l.run_id = o.run_id AND l.symbol = o.symbol
+            WHERE o.created_at >= ? AND o.created_at < ?
+            GROUP BY o.run_id, o.symbol
+            ORDER BY o.created_at, o.rank
+        ''', (start, end))
+        return [
+            {"symbol": symbol, "quantity": quantity, "price": price, "capital": capital, "legs": legs or 0,
+             "failed": failed or 0, "traded": traded or 0, "cancelled": cancelled or 0, "avg_latency_ms": avg_latency_ms}
+            for symbol, quantity, price, capital, legs, failed, traded, cancelled, avg_latency_ms in rows
+        ]
+
+
+def _price_or_none(value):
+    """Scan prices can be blank or null; those are stored as NULL."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _is_locked(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def get_store():
+    """Returns the process-wide store for DB_FILE, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != DB_FILE:
+            if _store is not None:
+                _store.close()
+            _store = Store(DB_FILE)
+        return _store
+
+
+@atexit.register
+def _close_store():
+    # The writer is a daemon thread, so commit anything still queued before the interpreter exits.
+    if _store is not None:
+        _store.close()
+
+
+def init_db():
+    """Initializes the database and creates all tables if they don't exist."""
+    get_store()
 
 def save_credentials(client_id, access_token):
     """Saves or updates the user credentials in the database."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
     # Use INSERT OR REPLACE to handle both new and existing entries
-    cursor.execute('''
+    get_store().execute('''
         INSERT OR REPLACE INTO credentials (id, client_id, access_token)
         VALUES (1, ?, ?)
     ''', (client_id, access_token))
-    conn.commit()
-    conn.close()
 
 def get_credentials():
     """Retrieves user credentials from the database."""
     if not os.path.exists(DB_FILE):
         return None
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT client_id, access_token FROM credentials WHERE id = 1')
-    creds = cursor.fetchone()
-    conn.close()
-    return creds if creds else None
\ No newline at end of file
+    creds = get_store().query('SELECT client_id, access_token FROM credentials WHERE id = 1')
+    return creds[0] if creds else None
+
+def save_account(name, client_id, access_token):
+    """Saves or updates a named broker account."""
+    get_store().execute('INSERT OR REPLACE INTO accounts (name, client_id, access_token) VALUES (?, ?, ?)', (name, client_id, access_token))
+
+def get_accounts():
+    """Returns every named account as {name: (client_id, access_token)}."""
+    if not os.path.exists(DB_FILE):
+        return {}
+    return {name: (client_id, access_token)
+            for name, client_id, access_token in get_store().query('SELECT name, client_id, access_token FROM accounts ORDER BY name')}
+
+def delete_account(name):
+    get_store().execute('DELETE FROM accounts WHERE name = ?', (name,))
+
+def save_run(tracer, status):
+    """Queues one execution and all of its latency spans for writing."""
+    get_store().save_run(tracer, status)
+
+def get_run_history(limit=20):
+    """Returns the most recent runs, newest first, each with its spans in recording order."""
+    if not os.path.exists(DB_FILE):
+        return []
+    store = get_store()
+    store.flush()
+    return store.get_run_history(limit)
+
+def get_day_report(day):
+    """Per-symbol totals for the positions opened on `day`."""
+    if not os.path.exists(DB_FILE):
+        return []
+    store = get_store()
+    store.flush()
+    return store.get_day_report(day)
@@ -0,0 +1,294 @@
+# file: headless.py
+import sys
+import json
+import signal
+import argparse
+import threading
+from datetime import datetime, time as dt_time, timedelta
+
+import database
+import log_sink
+import scheduler
+import order_engine
+import pricing
+import poller
+import trading_logic
+
+# Runs the configured trades without the GUI, for an always-on Linux box under systemd or similar.
+# Only the trading modules are loaded (no customtkinter/PIL), and every log record goes to stdout as one JSON line.
+
+DEFAULT_CONFIG = "headless.json"
+# Jobs without an "account" trade the top-level client_id/access_token, or the credentials saved by the GUI.
+DEFAULT_ACCOUNT = "default"
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+TRADING_DAYS = WEEKDAYS[:5]
+
+# On stop, a run that is already placing orders gets this long to finish.
+SHUTDOWN_GRACE_SECONDS = 60
+
+# Optional job settings and their defaults; the required ones are checked in Job.__init__.
+JOB_DEFAULTS = {
+    "account": DEFAULT_ACCOUNT,
+    "prearm_seconds": 30.0,
+    "bracket_mode": False,
+    "poll_interval": 0.0,  # seconds between scans; 0 trades the first scan only
+    "poll_until": "15:15",
+    "days": TRADING_DAYS,
+    "quote_budget": pricing.DEFAULT_QUOTE_BUDGET,
+    "max_in_flight": order_engine.DEFAULT_MAX_IN_FLIGHT,
+    "orders_per_second": order_engine.DHAN_ORDERS_PER_SECOND,
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _parse_time(value, field):
+    try:
+        return dt_time.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{field}: expected a 24-hour time such as \"09:15:05\", got {value!r}")
+
+
+class Job:
+    """One configured strategy: what to trade and at what time on each trading day."""
+
+    def __init__(self, config, index):
+        if not isinstance(config, dict):
+            raise ConfigError(f"job {index + 1}: expected an object, got {type(config).__name__}")
+        settings = dict(JOB_DEFAULTS, **config)
+        self.name = settings.get("name") or f"job {index + 1}"
+        try:
+            self.link = str(settings["link"])
+            self.total_amount = float(settings["total_amount"])
+            self.profit_percent = float(settings["profit_percent"])
+            self.loss_percent = float(settings["loss_percent"])
+            self.no_of_stocks = int(settings["no_of_stocks"])
+            self.prearm_seconds = max(0.0, float(settings["prearm_seconds"]))
+            self.poll_interval = max(0.0, float(settings["poll_interval"]))
+            self.quote_budget = float(settings["quote_budget"])
+            self.max_in_flight = int(settings["max_in_flight"])
+            self.orders_per_second = float(settings["orders_per_second"])
+        except KeyError as e:
+            raise ConfigError(f"{self.name}: missing required setting {e.args[0]!r}")
+        except (TypeError, ValueError) as e:
+            raise ConfigError(f"{self.name}: {e}")
+        self.account = str(settings["account"])
+        self.bracket_mode = bool(settings["bracket_mode"])
+        self.time = _parse_time(settings.get("time"), f"{self.name}.time")
+        self.poll_until = _parse_time(settings["poll_until"], f"{self.name}.poll_until")
+        if not isinstance(settings["days"], list):
+            raise ConfigError(f"{self.name}.days: expected a list such as [\"mon\", \"wed\"]")
+        days = [str(day).lower()[:3] for day in settings["days"]]
+        unknown = [day for day in days if day not in WEEKDAYS]
+        if unknown:
+            raise ConfigError(f"{self.name}.days: unknown day(s) {', '.join(unknown)}")
+        self.days = {WEEKDAYS.index(day) for day in days}
+
+        self.scheduler = None
+        self.prearm_thread = None
+        self.prepared = None
+        self.poller = None
+        self.run_thread = None
+
+    def next_trigger(self, now):
+        """The first trading-day occurrence of the job's time after `now`."""
+        target = datetime.combine(now.date(), self.time)
+        while target <= now or target.weekday() not in self.days:
+            target += timedelta(days=1)
+        return target
+
+    def run_options(self):
+        return {"max_in_flight": self.max_in_flight, "orders_per_second": self.orders_per_second, "quote_budget": self.quote_budget}
+
+
+def load_config(path):
+    """Reads and validates the JSON config. Returns (accounts, jobs, endpoints); raises ConfigError on bad input.
+
+    accounts maps each account name used by a job to its (client_id, access_token). Names are looked up in
+    the config's "accounts" first and then in the accounts saved in the database.
+    endpoints holds the optional broker_url/order_feed_url overrides, e.g. for a dry run against mock_servers.py.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    except OSError as e:
+        raise ConfigError(f"Cannot read {path}: {e}")
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"{path} is not valid JSON: {e}")
+
+    if not isinstance(config, dict):
+        raise ConfigError(f"{path}: expected a JSON object at the top level")
+    if not isinstance(config.get("jobs") or [], list):
+        raise ConfigError("\"jobs\" must be a list of job objects")
+    accounts = config.get("accounts") or {}
+    if not isinstance(accounts, dict) or not all(isinstance(account, dict) for account in accounts.values()):
+        raise ConfigError("\"accounts\" must map account names to objects with client_id and access_token")
+
+    jobs = [Job(job, index) for index, job in enumerate(config.get("jobs") or [])]
+    if not jobs:
+        raise ConfigError(f"{path} defines no jobs")
+
+    accounts = {}
+    for name in sorted({job.account for job in jobs}):
+        accounts[name] = _account_credentials(config, name)
+    endpoints = {key: config[key] for key in ("broker_url", "order_feed_url") if config.get(key)}
+    return accounts, jobs, endpoints
+
+
+def _account_credentials(config, name):
+    account = (config.get("accounts") or {}).get(name)
+    if account is None and name == DEFAULT_ACCOUNT:
+        account = config
+    credentials = (account or {}).get("client_id"), (account or {}).get("access_token")
+    if all(credentials):
+        return tuple(str(value) for value in credentials)
+
+    # Fall back to the accounts saved in the database; the default one is the GUI's login.
+    saved = database.get_credentials() if name == DEFAULT_ACCOUNT else database.get_accounts().get(name)
+    if not saved:
+        if name == DEFAULT_ACCOUNT:
+            raise ConfigError("No DhanHQ credentials: set client_id and access_token in the config or save them from the app")
+        raise ConfigError(f"Unknown account {name!r}: add it under \"accounts\" in the config or save it with --save-account")
+    return tuple(saved)
+
+
+class HeadlessRunner:
+    """Schedules every job on its own TriggerScheduler and reschedules it for the next trading day after each run.
+
+    Jobs run concurrently in this one process. They share the instrument index and the Chartink
+    connection pool, and jobs on the same account share its broker gateway, order-update stream and
+    order rate limit, so each extra job costs little more than its own scans and orders.
+    """
+
+    def __init__(self, jobs, accounts, log_callback, endpoints=None):
+        self.jobs = jobs
+        self.accounts = accounts  # name -> (client_id, access_token)
+        self.log_callback = log_callback
+        self.endpoints = endpoints or {}
+        self._stopping = threading.Event()
+
+    def start(self):
+        for job in self.jobs:
+            self._schedule(job)
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        for job in self.jobs:
+            if job.scheduler:
+                job.scheduler.cancel()
+            if job.poller:
+                job.poller.cancel()
+
+    def wait(self):
+        # Event.wait with a timeout keeps the main thread responsive to signals.
+        while not self._stopping.wait(1.0):
+            pass
+
+    def _schedule(self, job):
+        if self._stopping.is_set():
+            return
+        target = job.next_trigger(datetime.now())
+        job.scheduler = scheduler.TriggerScheduler(
+            target,
+            on_trigger=lambda: self._fire(job),
+            on_prearm=lambda: self._prearm(job),
+            prearm_seconds=job.prearm_seconds,
+            log_callback=self.log_callback,
+        ).start()
+        self.log_callback(f"{job.name}: next run at {target:%Y-%m-%d %H:%M:%S}", stage="schedule")
+
+    def _prearm(self, job):
+        client_id, access_token = self.accounts[job.account]
+
+        def prearm():
+            job.prepared = trading_logic.prearm(job.link, client_id, access_token, self.log_callback,
+                                                warm_connections=job.no_of_stocks, **self.endpoints)
+
+        job.prearm_thread = threading.Thread(target=prearm, daemon=True)
+        job.prearm_thread.start()
+
+    def _fire(self, job):
+        """Called on the job's scheduler thread at the trigger time."""
+        trigger_error = job.scheduler.trigger_error
+        prearm_thread, job.prearm_thread = job.prearm_thread, None
+        client_id, access_token = self.accounts[job.account]
+
+        def run():
+            prepared = None
+            if prearm_thread:
+                prearm_thread.join()
+                prepared, job.prepared = job.prepared, None
+            try:
+                if job.poll_interval > 0:
+                    job.poller = poller.ScanPoller(job.link, job.total_amount, job.profit_percent, job.loss_percent, job.no_of_stocks,
+                                                   client_id, access_token, self.log_callback, interval=job.poll_interval,
+                                                   end_time=datetime.combine(datetime.now().date(), job.poll_until),
+                                                   bracket_mode=job.bracket_mode, **self.endpoints, **job.run_options())
+                    job.poller.run(prepared, trigger_error)
+                else:
+                    trading_logic.run_trading_script(job.link, job.total_amount, job.profit_percent, job.loss_percent, job.no_of_stocks,
+                                                     client_id, access_token, self.log_callback, prepared=prepared,
+                                                     bracket_mode=job.bracket_mode, trigger_error=trigger_error, **self.endpoints,
+                                                     **job.run_options())
+            finally:
+                job.poller = None
+                self._schedule(job)
+
+        job.run_thread = threading.Thread(target=run, daemon=True)
+        job.run_thread.start()
+
+    def join(self, timeout):
+        """Waits for runs already in progress, so a stop never leaves a BUY without its exit orders."""
+        for job in self.jobs:
+            if job.run_thread:
+                job.run_thread.join(timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the configured trades without the GUI.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="JSON file with credentials and jobs")
+    parser.add_argument("--log-file", default=log_sink.LOG_FILE, help="rotating log file, in addition to stdout ('' for none)")
+    parser.add_argument("--check", action="store_true", help="validate the config, print the next run times and exit")
+    parser.add_argument("--save-account", nargs=3, metavar=("NAME", "CLIENT_ID", "ACCESS_TOKEN"),
+                        help="save a named broker account in the database for jobs to use, and exit")
+    args = parser.parse_args(argv)
+
+    if args.save_account:
+        database.save_account(*args.save_account)
+        print(f"Saved account {args.save_account[0]!r}.")
+        return 0
+
+    try:
+        accounts, jobs, endpoints = load_config(args.config)
+    except ConfigError as e:
+        print(f"Config error: {e}", file=sys.stderr)
+        return 2
+    if args.check:
+        now = datetime.now()
+        for job in jobs:
+            print(f"{job.name} ({job.account}, {accounts[job.account][0]}): next run at {job.next_trigger(now):%Y-%m-%d %H:%M:%S}")
+        return 0
+
+    sink = log_sink.LogSink(log_file=args.log_file or None, stream=sys.stdout, drainable=False)
+    runner = HeadlessRunner(jobs, accounts, sink, endpoints)
+
+    def handle_signal(signum, frame):
+        sink(f"Received signal {signum}, stopping.", stage="daemon")
+        runner.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    sink(f"Headless runner started with {len(jobs)} job(s) on {len(accounts)} account(s).", stage="daemon")
+    runner.start().wait()
+    runner.join(SHUTDOWN_GRACE_SECONDS)
+    sink("Headless runner stopped.", stage="daemon")
+    sink.flush(5)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
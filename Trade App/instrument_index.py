@@ -0,0 +1,143 @@
+# file: instrument_index.py
+import os
+import csv
+import pickle
+import threading
+from collections import namedtuple
+
+CSV_FILE = "equity.csv"
+
+# Bump this whenever the layout of an Instrument record changes so stale index files get rebuilt.
+INDEX_VERSION = 2
+
+# TICK_SIZE in the Dhan instrument master is quoted in paise.
+PAISE_PER_RUPEE = 100
+
+Instrument = namedtuple("Instrument", [
+    "security_id", "tick_size", "lot_size",
+    # Bracket-order eligibility and the stop/target distances (percent of price) the broker accepts for a BUY.
+    "bracket", "bo_sl_min", "bo_sl_max", "bo_profit_min", "bo_profit_max",
+])
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class InstrumentIndex:
+    """In-memory (exchange, series, symbol) -> Instrument map compiled from the instrument master."""
+
+    def __init__(self, instruments):
+        self._instruments = instruments
+
+    def __len__(self):
+        return len(self._instruments)
+
+    def __contains__(self, key):
+        return key in self._instruments
+
+    def get(self, symbol, exchange="NSE", series="EQ"):
+        """Returns the Instrument for a symbol, or None if it is not listed."""
+        return self._instruments.get((exchange, series, str(symbol).strip().upper()))
+
+    def security_id(self, symbol, exchange="NSE", series="EQ"):
+        """Returns only the Dhan security ID for a symbol, or None if it is not listed."""
+        instrument = self.get(symbol, exchange, series)
+        return instrument.security_id if instrument else None
+
+
+def bracket_ineligibility(instrument, profit_percent, loss_percent):
+    """Returns why a bracket BUY would be rejected for this instrument, or None if it is allowed."""
+    if not instrument.bracket:
+        return "bracket orders are not enabled for this instrument"
+    if not instrument.bo_sl_min <= loss_percent <= instrument.bo_sl_max:
+        return f"loss {loss_percent}% is outside the allowed {instrument.bo_sl_min}-{instrument.bo_sl_max}%"
+    if not instrument.bo_profit_min <= profit_percent <= instrument.bo_profit_max:
+        return f"profit {profit_percent}% is outside the allowed {instrument.bo_profit_min}-{instrument.bo_profit_max}%"
+    return None
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return (INDEX_VERSION, stat.st_size, stat.st_mtime_ns)
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_int(value, default=1):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def build_instruments(csv_path=CSV_FILE):
+    """Parses the instrument master once with the csv module and returns the raw lookup dict."""
+    instruments = {}
+    # The Dhan master ships with a UTF-8 BOM in front of the first header.
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            symbol = (row.get("UNDERLYING_SYMBOL") or "").strip().upper()
+            if not symbol:
+                continue
+            key = (row.get("EXCH_ID", "").strip(), row.get("SERIES", "").strip(), symbol)
+            # Keep the first listing, matching the old first-row-wins behaviour of get_seq_id.
+            if key in instruments:
+                continue
+            instruments[key] = Instrument(
+                security_id=row["SECURITY_ID"].strip(),
+                tick_size=_to_float(row.get("TICK_SIZE"), 5) / PAISE_PER_RUPEE,
+                lot_size=_to_int(row.get("LOT_SIZE")),
+                bracket=row.get("BRACKET_FLAG", "").strip().upper() == "Y",
+                bo_sl_min=_to_float(row.get("BUY_BO_SL_RANGE_MIN_PERC")),
+                bo_sl_max=_to_float(row.get("BUY_BO_SL_RANGE_MAX_PERC")),
+                bo_profit_min=_to_float(row.get("BUY_BO_PROFIT_RANGE_MIN_PERC")),
+                bo_profit_max=_to_float(row.get("BUY_BO_PROFIT_RANGE_MAX_PERC")),
+            )
+    return instruments
+
+
+def _read_index_file(index_path, signature):
+    try:
+        with open(index_path, "rb") as f:
+            stored_signature, instruments = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError, AttributeError):
+        return None
+    return instruments if stored_signature == signature else None
+
+
+def _write_index_file(index_path, signature, instruments):
+    # Write to a temp file first so a crash never leaves a half-written index behind.
+    tmp_path = index_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump((signature, instruments), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        # A read-only install folder only costs us the on-disk cache, not the lookup itself.
+        pass
+
+
+def load_index(csv_path=CSV_FILE, index_path=None):
+    """Returns the instrument index, rebuilding the compiled file only when the CSV has changed."""
+    if index_path is None:
+        index_path = os.path.splitext(csv_path)[0] + ".idx"
+    signature = _source_signature(csv_path)
+
+    with _cache_lock:
+        cached = _cache.get(csv_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        instruments = _read_index_file(index_path, signature)
+        if instruments is None:
+            instruments = build_instruments(csv_path)
+            _write_index_file(index_path, signature, instruments)
+
+        index = InstrumentIndex(instruments)
+        _cache[csv_path] = (signature, index)
+        return index
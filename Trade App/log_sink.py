@@ -0,0 +1,119 @@
+# file: log_sink.py
+import json
+import queue
+import logging
+import threading
+import time
+from collections import namedtuple
+from logging.handlers import RotatingFileHandler
+
+LOG_FILE = "trading.log"
+MAX_LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+
+LogRecord = namedtuple("LogRecord", ["timestamp", "message", "stage", "symbol", "latency_ms"])
+
+
+def format_record(record):
+    """One line of text for a record: time, optional stage/symbol/latency tags, then the message."""
+    tags = []
+    if record.stage:
+        tags.append(record.stage)
+    if record.symbol:
+        tags.append(record.symbol)
+    if record.latency_ms is not None:
+        tags.append(f"{record.latency_ms:.1f} ms")
+    prefix = time.strftime("%H:%M:%S", time.localtime(record.timestamp)) + f".{int(record.timestamp % 1 * 1000):03d}"
+    if tags:
+        prefix += " [" + " | ".join(tags) + "]"
+    # GUI messages carry leading newlines for spacing; the file keeps one record per line.
+    return f"{prefix} {record.message.strip()}"
+
+
+def format_json(record):
+    """One JSON object per record for log collectors; fields that are not set are left out."""
+    fields = {"time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.timestamp)) + f".{int(record.timestamp % 1 * 1000):03d}"}
+    if record.stage:
+        fields["stage"] = record.stage
+    if record.symbol:
+        fields["symbol"] = record.symbol
+    if record.latency_ms is not None:
+        fields["latency_ms"] = round(record.latency_ms, 3)
+    fields["message"] = record.message.strip()
+    return json.dumps(fields, ensure_ascii=False)
+
+
+class LogSink:
+    """A log callback that only enqueues structured records, so trading threads never wait on the GUI or disk.
+
+    Call it like the plain `log_callback(message)` it replaces; `stage`, `symbol` and `latency_ms` are
+    optional keyword fields. The GUI drains its queue in batches with drain(); a background writer
+    streams the same records to a rotating log file and, as JSON lines, to `stream` if one is given.
+    Without a GUI pass drainable=False so nothing piles up waiting for drain().
+    """
+
+    def __init__(self, log_file=LOG_FILE, max_bytes=MAX_LOG_BYTES, backups=LOG_BACKUPS, stream=None, drainable=True):
+        # SimpleQueue.put is a lock-free C call, cheap enough for the order threads.
+        self._gui_queue = queue.SimpleQueue() if drainable else None
+        self._file_queue = queue.SimpleQueue() if log_file or stream else None
+        self._stream = stream
+        self._file_logger = None
+        if log_file:
+            self._file_logger = logging.getLogger(f"{__name__}.{id(self)}")
+            self._file_logger.propagate = False
+            self._file_logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger.addHandler(handler)
+        if self._file_queue is not None:
+            threading.Thread(target=self._write_file, daemon=True).start()
+
+    def __call__(self, message, stage=None, symbol=None, latency_ms=None):
+        record = LogRecord(time.time(), message, stage, symbol, latency_ms)
+        if self._gui_queue is not None:
+            self._gui_queue.put(record)
+        if self._file_queue is not None:
+            self._file_queue.put(record)
+
+    def drain(self, max_records=500):
+        """Returns up to `max_records` (None for all) queued records without blocking."""
+        records = []
+        if self._gui_queue is None:
+            return records
+        try:
+            while max_records is None or len(records) < max_records:
+                records.append(self._gui_queue.get_nowait())
+        except queue.Empty:
+            pass
+        return records
+
+    def flush(self, timeout=None):
+        """Blocks until every record logged so far has been written out. Returns False on timeout."""
+        if self._file_queue is None:
+            return True
+        done = threading.Event()
+        self._file_queue.put(done)
+        return done.wait(timeout)
+
+    def _write_file(self):
+        while True:
+            record = self._file_queue.get()
+            if isinstance(record, threading.Event):
+                record.set()
+                continue
+            if self._file_logger:
+                self._file_logger.info(format_record(record))
+            if self._stream:
+                self._stream.write(format_json(record) + "\n")
+                self._stream.flush()
+
+
+def adapt(log_callback):
+    """Lets code log structured fields even when handed a plain `callback(message)` such as print."""
+    if isinstance(log_callback, LogSink):
+        return log_callback
+
+    def plain_callback(message, stage=None, symbol=None, latency_ms=None):
+        log_callback(message)
+
+    return plain_callback
@@ -0,0 +1,342 @@
+# file: mock_servers.py
+import csv
+import json
+import time
+import asyncio
+import random
+import secrets
+import threading
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import websockets
+
+import instrument_index
+
+# Local stand-ins for the remote services the trading script talks to, so it can be exercised offline.
+
+MOCK_SCAN_CLAUSE = "( {cash} ( latest close > latest sma( close,20 ) ) )"
+
+
+def sample_scan_rows(count, csv_path="equity.csv", seed=0):
+    """Builds `count` Chartink-style result rows from real symbols in the instrument master."""
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        listings = [(row["UNDERLYING_SYMBOL"], row["SYMBOL_NAME"]) for row in csv.DictReader(f) if row.get("SERIES") == "EQ"]
+    rng = random.Random(seed)
+    picked = rng.sample(listings, min(count, len(listings)))
+    return [
+        {
+            "sr": i + 1,
+            "nsecode": symbol,
+            "name": name,
+            "bsecode": None,
+            "per_chg": round(rng.uniform(0.5, 5.0), 2),
+            "close": round(rng.uniform(50, 2500), 2),
+            "volume": rng.randint(10_000, 5_000_000),
+        }
+        for i, (symbol, name) in enumerate(picked)
+    ]
+
+
+def quote_prices(rows, drift=0.005, csv_path="equity.csv", seed=0):
+    """{security_id: last price} for scan rows, each moved up to `drift` (a fraction) from its scan close."""
+    index = instrument_index.load_index(csv_path)
+    rng = random.Random(seed)
+    return {
+        index.security_id(row["nsecode"]): round(row["close"] * (1 + rng.uniform(-drift, drift)), 2)
+        for row in rows
+        if index.security_id(row["nsecode"]) is not None
+    }
+
+
+class _MockServer:
+    """Runs a ThreadingHTTPServer on a background thread bound to an ephemeral localhost port."""
+
+    handler_class = None
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        handler = type("BoundHandler", (self.handler_class,), {"server_state": self})
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    server_state = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def send_body(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up waiting, e.g. a quote past its latency budget
+
+
+class _ChartinkHandler(_JSONHandler):
+    def do_GET(self):
+        state = self.server_state
+        state.count_request()
+        if not self.path.startswith("/screener/"):
+            return self.send_body(404, {"message": "Not Found"})
+        page = (
+            '<html><head><meta name="csrf-token" content="{token}"></head><body>'
+            '<form><textarea name="scan_clause">{clause}</textarea></form></body></html>'
+        ).format(token=state.csrf_token, clause=state.scan_clause)
+        self.send_body(200, page.encode(), "text/html; charset=UTF-8", {"Set-Cookie": f"ci_session={state.cookie}; Path=/"})
+
+    def do_POST(self):
+        state = self.server_state
+        state.count_request()
+        if self.path != "/screener/process":
+            return self.send_body(404, {"message": "Not Found"})
+        form = parse_qs(self.read_body().decode())
+        if self.headers.get("X-CSRF-TOKEN") != state.csrf_token or f"ci_session={state.cookie}" not in (self.headers.get("Cookie") or ""):
+            return self.send_body(419, {"message": "CSRF token mismatch."})
+        if form.get("scan_clause", [""])[0] != state.scan_clause:
+            return self.send_body(422, {"message": "Invalid scan clause."})
+        self.send_body(200, {"draw": 1, "recordsTotal": len(state.rows), "recordsFiltered": len(state.rows), "data": state.rows})
+
+
+class MockChartinkServer(_MockServer):
+    """Serves a screener page with a CSRF token and answers /screener/process with canned rows."""
+
+    handler_class = _ChartinkHandler
+
+    def __init__(self, rows=None, latency=0.0):
+        super().__init__(latency)
+        self.rows = rows if rows is not None else sample_scan_rows(10)
+        self.scan_clause = MOCK_SCAN_CLAUSE
+        self.csrf_token = secrets.token_hex(20)
+        self.cookie = secrets.token_hex(16)
+
+    @property
+    def screener_link(self):
+        return f"{self.base_url}/screener/mock-scan"
+
+    def rotate_csrf_token(self):
+        """Invalidates the current token, as Chartink does when a session expires."""
+        self.csrf_token = secrets.token_hex(20)
+
+
+class _DhanHandler(_JSONHandler):
+    def do_GET(self):
+        state = self.server_state
+        state.count_request()
+        if self.path == "/fundlimit":
+            return self.send_body(200, {"dhanClientId": state.client_id, "availabelBalance": 1_000_000.0})
+        self.send_body(404, {"errorType": "Input_Exception", "errorCode": "DH-905", "errorMessage": "Not found"})
+
+    def do_POST(self):
+        state = self.server_state
+        state.count_request()
+        payload = json.loads(self.read_body() or b"{}")
+        if self.path == "/marketfeed/ltp":
+            return self.send_body(200, state.quote(payload))
+        if self.path != "/orders":
+            return self.send_body(404, {"errorType": "Input_Exception", "errorCode": "DH-905", "errorMessage": "Not found"})
+        status, body = state.place_order(payload)
+        self.send_body(status, body)
+
+    def do_DELETE(self):
+        state = self.server_state
+        state.count_request()
+        if not self.path.startswith("/orders/"):
+            return self.send_body(404, {"errorType": "Input_Exception", "errorCode": "DH-905", "errorMessage": "Not found"})
+        status, body = state.cancel_order(self.path[len("/orders/"):])
+        self.send_body(status, body)
+
+
+class MockDhanServer(_MockServer):
+    """A DhanHQ v2 stand-in with configurable latency, random rejections and a per-second order limit.
+
+    Point a BrokerGateway at `base_url`. Accepted orders are kept in `orders` for inspection. Quotes for
+    /marketfeed/ltp come from `prices` ({security_id: price}); `quote_latency` adds delay to those alone.
+
+    With `order_feed=True` it also serves the live order-update websocket at `order_feed_url`: MARKET
+    orders fill at once, while SL and LIMIT orders stay pending until fill() is called.
+    """
+
+    handler_class = _DhanHandler
+
+    def __init__(self, latency=0.0, failure_rate=0.0, orders_per_second=None, client_id="1000000001", seed=0,
+                 prices=None, quote_latency=0.0, order_feed=False):
+        super().__init__(latency)
+        self.order_feed = order_feed
+        self.order_status = {}  # order_id -> "PENDING" / "TRADED" / "CANCELLED"
+        self._feed_loop = None
+        self._feed_port = None
+        self._feed_clients = set()
+        self._feed_ready = threading.Event()
+        self.prices = dict(prices or {})
+        self.quote_latency = quote_latency
+        self.quotes = 0
+        self.failure_rate = failure_rate
+        self.orders_per_second = orders_per_second
+        self.client_id = client_id
+        self.orders = []
+        self.rejected = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._recent = {}  # client id -> acceptance times inside the last second; the limit is per account, like Dhan's
+        self._orders_lock = threading.Lock()
+
+    def quote(self, payload):
+        self.quotes += 1
+        if self.quote_latency:
+            time.sleep(self.quote_latency)
+        data = {}
+        for segment, security_ids in payload.items():
+            data[segment] = {str(security_id): {"last_price": self.prices[str(security_id)]}
+                             for security_id in security_ids if str(security_id) in self.prices}
+        return {"data": data, "status": "success"}
+
+    def place_order(self, payload):
+        with self._orders_lock:
+            now = time.monotonic()
+            if self.orders_per_second:
+                client_id = str(payload.get("dhanClientId"))
+                recent = self._recent[client_id] = [t for t in self._recent.get(client_id, []) if now - t < 1.0]
+                if len(recent) >= self.orders_per_second:
+                    self.rate_limited += 1
+                    return 429, {"errorType": "Rate_Limit", "errorCode": "DH-904", "errorMessage": "Too many requests"}
+                recent.append(now)
+            if self.failure_rate and self._rng.random() < self.failure_rate:
+                self.rejected += 1
+                return 400, {"errorType": "Order_Error", "errorCode": "DH-906", "errorMessage": "Order rejected by mock broker"}
+            order_id = str(100000 + len(self.orders))
+            self.orders.append(dict(payload, orderId=order_id))
+            self.order_status[order_id] = "PENDING"
+        self._publish(order_id, "Pending")
+        if payload.get("orderType") == "MARKET":
+            self.fill(order_id)
+        return 200, {"orderId": order_id, "orderStatus": "TRANSIT"}
+
+    def fill(self, order_id):
+        """Fills a pending order, as the exchange would when its price is hit. Returns False if it was not pending."""
+        with self._orders_lock:
+            if self.order_status.get(order_id) != "PENDING":
+                return False
+            self.order_status[order_id] = "TRADED"
+        self._publish(order_id, "Traded")
+        return True
+
+    def cancel_order(self, order_id):
+        with self._orders_lock:
+            status = self.order_status.get(order_id)
+            if status != "PENDING":
+                return 400, {"errorType": "Order_Error", "errorCode": "DH-906", "errorMessage": f"Order is {status or 'unknown'}"}
+            self.order_status[order_id] = "CANCELLED"
+        self._publish(order_id, "Cancelled")
+        return 200, {"orderId": order_id, "orderStatus": "CANCELLED"}
+
+    # --- Order-update websocket ---
+
+    @property
+    def order_feed_url(self):
+        return f"ws://127.0.0.1:{self._feed_port}"
+
+    def start(self):
+        super().start()
+        if self.order_feed:
+            threading.Thread(target=lambda: asyncio.run(self._serve_order_feed()), daemon=True).start()
+            self._feed_ready.wait(5)
+        return self
+
+    def stop(self):
+        if self._feed_loop:
+            self._feed_loop.call_soon_threadsafe(self._feed_stop.set_result, None)
+            self._feed_loop = None
+        super().stop()
+
+    async def _serve_order_feed(self):
+        self._feed_stop = asyncio.get_running_loop().create_future()
+        async with websockets.serve(self._feed_client, "127.0.0.1", 0) as server:
+            self._feed_port = next(iter(server.sockets)).getsockname()[1]
+            self._feed_loop = asyncio.get_running_loop()
+            self._feed_ready.set()
+            await self._feed_stop
+
+    async def _feed_client(self, websocket):
+        await websocket.recv()  # LoginReq; the stand-in accepts any token
+        self._feed_clients.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self._feed_clients.discard(websocket)
+
+    def _publish(self, order_id, status):
+        if self._feed_loop is None:
+            return
+        order = self.orders[int(order_id) - 100000]
+        message = json.dumps({"Type": "order_alert", "Data": {
+            "OrderNo": order_id,
+            "Status": status,
+            "SecurityId": order.get("securityId"),
+            "TxnType": "B" if order.get("transactionType") == "BUY" else "S",
+            "OrderType": order.get("orderType"),
+            "Quantity": order.get("quantity"),
+            "TradedQty": order.get("quantity") if status == "Traded" else 0,
+        }})
+        # broadcast() queues the frame on every connection without awaiting, preserving update order.
+        self._feed_loop.call_soon_threadsafe(websockets.broadcast, self._feed_clients, message)
+
+
+if __name__ == "__main__":
+    chartink_server = MockChartinkServer().start()
+    dhan_server = MockDhanServer(latency=0.02, orders_per_second=10, order_feed=True).start()
+    print(f"Mock Chartink screener: {chartink_server.screener_link}")
+    print(f"Mock DhanHQ API:        {dhan_server.base_url}")
+    print(f"Mock order updates:     {dhan_server.order_feed_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        chartink_server.stop()
+        dhan_server.stop()
@@ -0,0 +1,236 @@
+# file: order_engine.py
+import time
+import asyncio
+import threading
+import itertools
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import broker
+import tracing
+
+# Dhan's order APIs accept at most 10 orders per second per account.
+DHAN_ORDERS_PER_SECOND = 10
+# The broker counts orders by arrival, so the window is stretched a little to absorb jitter between send and arrival.
+RATE_LIMIT_PERIOD = 1.05
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# Legs of one trade, in the order they are queued. Exit legs are only queued once the BUY is acknowledged.
+# A BRACKET leg replaces all three with a single request that carries its own stop and target.
+BUY, STOP_LOSS, TARGET, BRACKET = 0, 1, 2, 3
+LEG_NAMES = {BUY: "BUY", STOP_LOSS: "Stop-Loss", TARGET: "Target", BRACKET: "Bracket"}
+
+# bracket_profit/bracket_stop are price distances from the entry; both are None when the plan uses three legs.
+# price is the entry price the plan was sized at; entry_order_id is filled in once the BUY is acknowledged.
+OrderPlan = namedtuple(
+    "OrderPlan",
+    ["rank", "name", "symbol", "security_id", "quantity", "stop_trigger", "stop_limit", "target", "bracket_profit", "bracket_stop",
+     "price", "entry_order_id"],
+    defaults=(None, None, None, None),
+)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Sliding-window limit of `rate` orders in any `period` seconds, shared by every thread that trades one account.
+
+    Each caller reserves the next free slot and then sleeps until it comes round. Unlike a continuously
+    refilled bucket this never lets more than `rate` orders into any window, which is how the broker
+    counts, while still allowing a full burst at the start. Concurrent strategies on the same account
+    draw from one limiter (see get_rate_limiter), so together they stay under the broker's limit.
+    """
+
+    def __init__(self, rate, period=RATE_LIMIT_PERIOD):
+        self.rate = max(1, int(rate))
+        self.period = period
+        self._slots = deque()  # reserved send times, ascending; some may lie in the future
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Claims the next slot and returns how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            while self._slots and now - self._slots[0] >= self.period:
+                self._slots.popleft()
+            slot = now
+            if len(self._slots) >= self.rate:
+                slot = max(now, self._slots[-self.rate] + self.period)
+            self._slots.append(slot)
+            return slot - now
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def get_rate_limiter(client_id, rate=DHAN_ORDERS_PER_SECOND):
+    """Returns the app-wide limiter for an account. When runs ask for different rates, the lowest one applies."""
+    key = str(client_id)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(rate)
+        else:
+            limiter.rate = min(limiter.rate, max(1, int(rate)))
+        return limiter
+
+
+class EngineStats:
+    """Submit latencies and throughput of one engine run."""
+
+    def __init__(self):
+        self.latencies = []  # seconds per broker call
+        self.failures = 0
+        self.elapsed = 0.0
+
+    @property
+    def orders(self):
+        return len(self.latencies)
+
+    def orders_per_second(self):
+        return self.orders / self.elapsed if self.elapsed > 0 else 0.0
+
+    def percentile(self, pct):
+        return tracing.percentile(self.latencies, pct)
+
+    def summary(self):
+        return (f"{self.orders} orders in {self.elapsed:.2f} s ({self.orders_per_second():.1f} orders/s), "
+                f"submit latency p50 {self.percentile(50) * 1000:.0f} ms, p99 {self.percentile(99) * 1000:.0f} ms, "
+                f"{self.failures} failed")
+
+
+class OrderEngine:
+    """Places BUY, Stop-Loss and Target legs for a basket with bounded concurrency and a broker rate limit.
+
+    Legs are served in scan-rank order. Each symbol's exit legs are queued the moment its BUY is
+    acknowledged, so protection does not wait behind lower-ranked entries. Plans carrying bracket
+    distances go out as one bracket order and fall back to the three-leg path if the broker rejects it.
+    Acknowledged orders are handed to `tracker` (an OrderTracker), which pairs each Stop-Loss and Target.
+    Every leg's outcome is queued on `store` (a database.Store) under the tracer's run id.
+    Pass the account's shared `limiter` when other runs may be trading the same account at the same time.
+    """
+
+    def __init__(self, gateway, log_callback, max_in_flight=DEFAULT_MAX_IN_FLIGHT, orders_per_second=DHAN_ORDERS_PER_SECOND, tracer=None,
+                 tracker=None, store=None, limiter=None):
+        self.gateway = gateway
+        self.tracer = tracer
+        self.tracker = tracker
+        self.store = store
+        self.log_callback = log_callback
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.orders_per_second = orders_per_second
+        self.limiter = limiter
+
+    def run(self, plans):
+        """Places every plan's legs and returns the EngineStats. Blocks the calling thread."""
+        return asyncio.run(self._run(list(plans)))
+
+    async def _run(self, plans):
+        stats = EngineStats()
+        if not plans:
+            return stats
+
+        self._queue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._limiter = self.limiter or RateLimiter(self.orders_per_second)
+        self._stats = stats
+        for plan in plans:
+            self._enqueue(plan, BRACKET if plan.bracket_profit is not None else BUY)
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            workers = [asyncio.create_task(self._worker(loop, executor)) for _ in range(self.max_in_flight)]
+            await self._queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    def _enqueue(self, plan, leg):
+        # Bracket and BUY legs are both entries, so they share a priority slot ahead of the exit legs.
+        self._queue.put_nowait((plan.rank, BUY if leg == BRACKET else leg, next(self._sequence), leg, plan))
+
+    async def _worker(self, loop, executor):
+        while True:
+            _, _, _, leg, plan = await self._queue.get()
+            try:
+                await self._limiter.acquire()
+                start = time.perf_counter()
+                span_start = self.tracer.now_ms() if self.tracer else None
+                response = await loop.run_in_executor(executor, self._submit, plan, leg)
+                latency = time.perf_counter() - start
+                self._stats.latencies.append(latency)
+                if self.tracer:
+                    self.tracer.record(f"order.{LEG_NAMES[leg]}", span_start, self.tracer.now_ms(), plan.symbol)
+                self._handle_response(plan, leg, response, latency)
+            except Exception as e:
+                self._stats.failures += 1
+                self._log(f"An unexpected error occurred while placing the {LEG_NAMES[leg]} order for {plan.name}: {e}", plan, leg)
+            finally:
+                self._queue.task_done()
+
+    def _log(self, message, plan, leg, latency=None):
+        self.log_callback(message, stage=LEG_NAMES[leg], symbol=plan.symbol,
+                          latency_ms=latency * 1000 if latency is not None else None)
+
+    def _submit(self, plan, leg):
+        if leg == BRACKET:
+            self._log(f"\nAttempting to place a BRACKET order for {plan.name} (Quantity: {plan.quantity}, "
+                      f"Target +{plan.bracket_profit}, Stop-Loss -{plan.bracket_stop})", plan, leg)
+            return self.gateway.place_bracket(plan.security_id, plan.quantity, plan.bracket_profit, plan.bracket_stop)
+        if leg == BUY:
+            self._log(f"\nAttempting to place a BUY for {plan.name} (Quantity: {plan.quantity})", plan, leg)
+            return self.gateway.place_buy(plan.security_id, plan.quantity)
+        if leg == STOP_LOSS:
+            self._log(f"Placing Stop-Loss for {plan.name} at Trigger {plan.stop_trigger}...", plan, leg)
+            return self.gateway.place_stop_loss(plan.security_id, plan.quantity, trigger_price=plan.stop_trigger, price=plan.stop_limit)
+        self._log(f"Placing Target for {plan.name} at {plan.target}...", plan, leg)
+        return self.gateway.place_target(plan.security_id, plan.quantity, price=plan.target)
+
+    def _handle_response(self, plan, leg, response, latency):
+        succeeded = bool(response) and response.get("status") == "success"
+        if not succeeded:
+            self._stats.failures += 1
+        data = (response.get("data") or {}) if succeeded else {}
+        order_id = data.get("orderId")
+        if self.store is not None:
+            # Recorded before the tracker sees the order, so its status updates find the row.
+            self.store.record_leg(self.tracer.run_id if self.tracer else None, plan.symbol, LEG_NAMES[leg], order_id,
+                                  latency * 1000, data.get("orderStatus", "FAILED") if succeeded else "FAILED")
+        if order_id is not None and self.tracker is not None:
+            self.tracker.register(plan, leg, order_id)
+
+        if leg == BRACKET:
+            self._log(f"--> Bracket Order Response for {plan.name}: {response.get('status', 'N/A') if response else 'N/A'}", plan, leg, latency)
+            if not succeeded and broker.is_rejection(response):
+                # The broker refused the order outright, so nothing was bought and the plain three-leg trade is safe.
+                self._log(f"--> Bracket order rejected for {plan.name}. Falling back to separate BUY, Stop-Loss and Target orders.", plan, leg)
+                self._enqueue(plan, BUY)
+            elif not succeeded:
+                # A timeout, dropped connection or server error: the bracket may be live, and a fallback BUY could double the position.
+                remarks = response.get("remarks", "N/A") if response else "N/A"
+                self._log(f"--> WARNING: Bracket order for {plan.name} has an unknown outcome ({remarks}). No fallback was placed. "
+                          "Check the order book before trading this stock.", plan, leg)
+        elif leg == BUY:
+            self._log(f"--> Buy Order Response for {plan.name}: {response.get('status', 'N/A') if response else 'N/A'}", plan, leg, latency)
+            if succeeded:
+                plan = plan._replace(entry_order_id=order_id)
+                self._enqueue(plan, STOP_LOSS)
+                self._enqueue(plan, TARGET)
+            else:
+                self._log(f"Buy order failed for {plan.name}. Halting further orders for this stock.", plan, leg)
+        elif leg == STOP_LOSS:
+            if succeeded:
+                self._log(f"--> Stop-Loss placed successfully for {plan.name}.", plan, leg, latency)
+            else:
+                self._log(f"--> WARNING: Failed to place Stop-Loss for {plan.name}. Please place it manually.", plan, leg, latency)
+        else:
+            if succeeded:
+                self._log(f"--> Profit Target placed successfully for {plan.name}.", plan, leg, latency)
+            else:
+                self._log(f"--> WARNING: Failed to place Profit Target for {plan.name}. Please place it manually.", plan, leg, latency)
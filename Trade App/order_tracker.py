@@ -0,0 +1,239 @@
+# file: order_tracker.py
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import websockets
+from dhanhq.orderupdate import OrderSocket
+
+import log_sink
+from order_engine import STOP_LOSS, TARGET, LEG_NAMES
+
+DHAN_ORDER_FEED_URL = "wss://api-order-update.dhan.co"
+
+# Statuses after which an order can neither fill nor be cancelled.
+TERMINAL_STATUSES = {"TRADED", "CANCELLED", "REJECTED", "EXPIRED"}
+
+# Updates can beat the order acknowledgement to us; those for unknown orders are held (newest N) until registered.
+MAX_EARLY_UPDATES = 10_000
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+class TrackedOrder:
+    """What the tracker knows about one placed order."""
+
+    __slots__ = ("order_id", "plan", "leg", "status", "traded_quantity", "sibling", "cancel_requested")
+
+    def __init__(self, order_id, plan, leg):
+        self.order_id = order_id
+        self.plan = plan
+        self.leg = leg
+        self.status = "TRANSIT"
+        self.traded_quantity = 0
+        self.sibling = None  # the other exit leg of the same position
+        self.cancel_requested = False
+
+
+def _field(data, *names):
+    for name in names:
+        if data.get(name) is not None:
+            return data[name]
+    return None
+
+
+class OrderTracker:
+    """Follows every order placed through one broker account, driven by the order-update stream instead of polling.
+
+    The Stop-Loss and Target of a position form a one-cancels-other pair: as soon as one is fully
+    traded the other is cancelled. Updates are applied with dict lookups under one lock and the
+    cancel requests go out on a small worker pool, so the stream is never held up by the REST API.
+    Status changes are queued on `store` (a database.Store), if given.
+    """
+
+    def __init__(self, gateway, log_callback, cancel_workers=4, store=None):
+        self.gateway = gateway
+        self.store = store
+        self.log_callback = log_sink.adapt(log_callback)
+        self.updates = 0
+        self.cancels = 0
+        self._orders = {}  # order_id -> TrackedOrder
+        self._open_exits = {}  # entry order id -> the first exit leg registered for it
+        self._early = OrderedDict()  # order_id -> latest update seen before register()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=cancel_workers)
+        self.stream = None
+
+    def register(self, plan, leg, order_id):
+        """Starts tracking an acknowledged order. Exit legs are paired by the entry order they protect."""
+        order_id = str(order_id)
+        to_cancel = []
+        with self._lock:
+            order = self._orders[order_id] = TrackedOrder(order_id, plan, leg)
+            if leg in (STOP_LOSS, TARGET) and plan.entry_order_id is not None:
+                sibling = self._open_exits.pop(plan.entry_order_id, None)
+                if sibling is None:
+                    self._open_exits[plan.entry_order_id] = order
+                else:
+                    order.sibling, sibling.sibling = sibling, order
+                    # The first leg may already have filled while this one was being placed.
+                    if sibling.status == "TRADED":
+                        to_cancel.append(self._claim_cancel(order))
+            early = self._early.pop(order_id, None)
+            if early is not None:
+                to_cancel.extend(self._apply(order, *early))
+        self._dispatch(to_cancel)
+
+    def on_message(self, message):
+        """Handles one message from the order-update stream (already JSON-decoded)."""
+        if message.get("Type") != "order_alert":
+            return
+        data = message.get("Data") or {}
+        order_id = _field(data, "OrderNo", "orderNo")
+        if order_id is None:
+            return
+        order_id = str(order_id)
+        status = str(_field(data, "Status", "status") or "").upper()
+        traded_quantity = int(_field(data, "TradedQty", "tradedQty") or 0)
+
+        with self._lock:
+            self.updates += 1
+            order = self._orders.get(order_id)
+            if order is None:
+                self._early[order_id] = (status, traded_quantity)
+                self._early.move_to_end(order_id)
+                if len(self._early) > MAX_EARLY_UPDATES:
+                    self._early.popitem(last=False)
+                return
+            to_cancel = self._apply(order, status, traded_quantity)
+        self._dispatch(to_cancel)
+
+    def _apply(self, order, status, traded_quantity):
+        """Updates one order's state. Returns the orders to cancel as a result. Caller holds the lock."""
+        if order.status in TERMINAL_STATUSES or (order.status, order.traded_quantity) == (status, traded_quantity):
+            return []
+        order.status = status
+        order.traded_quantity = traded_quantity
+        if self.store is not None:
+            self.store.update_leg(order.order_id, status, traded_quantity)
+        if status != "TRADED" or order.leg not in (STOP_LOSS, TARGET):
+            return []
+
+        sibling = order.sibling
+        self.log_callback(f"--> {LEG_NAMES[order.leg]} filled for {order.plan.name}.", stage=LEG_NAMES[order.leg], symbol=order.plan.symbol)
+        if sibling is None:
+            return []
+        if sibling.status == "TRADED":
+            self.log_callback(f"--> WARNING: Both exit legs of {order.plan.name} filled. Check the position manually.",
+                              stage="OCO", symbol=order.plan.symbol)
+            return []
+        if sibling.status in TERMINAL_STATUSES or sibling.cancel_requested:
+            return []
+        return [self._claim_cancel(sibling)]
+
+    def _claim_cancel(self, order):
+        order.cancel_requested = True
+        return order
+
+    def _dispatch(self, orders):
+        for order in orders:
+            self._executor.submit(self._cancel, order)
+
+    def _cancel(self, order):
+        start = time.perf_counter()
+        try:
+            response = self.gateway.cancel_order(order.order_id)
+        except Exception as e:
+            response = {"status": "failure", "remarks": str(e)}
+        latency_ms = (time.perf_counter() - start) * 1000
+        name = LEG_NAMES[order.leg]
+        if response and response.get("status") == "success":
+            self.cancels += 1
+            self.log_callback(f"--> Cancelled the {name} of {order.plan.name} (one-cancels-other).",
+                              stage="OCO", symbol=order.plan.symbol, latency_ms=latency_ms)
+        else:
+            remarks = response.get("remarks", "N/A") if response else "N/A"
+            self.log_callback(f"--> WARNING: Could not cancel the {name} of {order.plan.name}: {remarks}. Cancel it manually.",
+                              stage="OCO", symbol=order.plan.symbol, latency_ms=latency_ms)
+
+    def get(self, order_id):
+        with self._lock:
+            return self._orders.get(str(order_id))
+
+    def open_orders(self):
+        with self._lock:
+            return [order for order in self._orders.values() if order.status not in TERMINAL_STATUSES]
+
+
+class OrderUpdateStream(OrderSocket):
+    """Keeps the broker's order-update websocket open on a background thread, reconnecting when it drops."""
+
+    RECONNECT_DELAY = 2.0
+
+    def __init__(self, client_id, access_token, on_message, url=DHAN_ORDER_FEED_URL, log_callback=None):
+        super().__init__(client_id, access_token)
+        self.order_feed_wss = url
+        self.on_message = on_message
+        self.log_callback = log_sink.adapt(log_callback or (lambda message: None))
+        self.connected = threading.Event()
+        self._stopped = threading.Event()
+        self._loop = None
+        self._task = None
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    async def connect_order_update(self):
+        # Same login as dhanhq's OrderSocket, which would also print the access token to stdout.
+        async with websockets.connect(self.order_feed_wss) as websocket:
+            await websocket.send(json.dumps({
+                "LoginReq": {"MsgCode": 42, "ClientId": str(self.client_id), "Token": str(self.access_token)},
+                "UserType": "SELF",
+            }))
+            self.connected.set()
+            async for message in websocket:
+                self.on_message(json.loads(message))
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        await self.connect_order_update()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                asyncio.run(self._serve())
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if not self._stopped.is_set():
+                    self.log_callback(f"--> WARNING: Order-update stream disconnected ({e}). Reconnecting...", stage="OCO")
+            finally:
+                self._loop = None
+                self.connected.clear()
+            self._stopped.wait(self.RECONNECT_DELAY)
+
+
+def get_tracker(gateway, client_id, access_token, log_callback, feed_url=DHAN_ORDER_FEED_URL, store=None):
+    """Returns the app-wide tracker for an account, connecting its order-update stream on first use.
+
+    Exit legs can fill long after a run has finished, so the tracker outlives the run that placed them.
+    """
+    key = (str(client_id), access_token, feed_url)
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = OrderTracker(gateway, log_callback, store=store)
+            tracker.stream = OrderUpdateStream(client_id, access_token, tracker.on_message, feed_url, log_callback).start()
+            _trackers[key] = tracker
+        return tracker
@@ -1,17 +1,32 @@
 # file: pawar_trader_app.py
+import time
+LAUNCHED_AT = time.perf_counter()  # taken before the GUI toolkit loads, for the startup report
+
 import customtkinter as ctk
 import threading
-import time
-import requests
+import math
+import socket
 import os
 from PIL import Image
 from datetime import datetime, time as dt_time, timedelta
 
-# Import our own modules
-import trading_logic
+# Import our own modules. trading_logic and poller pull in pandas and dhanhq, so they are imported
+# on a background thread once the window is up (see warm_up) rather than here.
 import database
+import instrument_index
+import scheduler
+import log_sink
+
+# Reaching this host over TCP counts as being online.
+CONNECTIVITY_CHECK = ("www.google.com", 80)
 
 class App(ctk.CTk):
+    # The log view is refreshed in batches once per frame and keeps only the newest lines
+    LOG_FRAME_MS = 50
+    MAX_LOG_LINES = 2000
+    # How often the splash screen checks whether start-up work has finished
+    STARTUP_POLL_MS = 20
+
     def __init__(self):
         super().__init__()
 
@@ -25,8 +40,17 @@ class App(ctk.CTk):
         self.client_id = None
         self.access_token = None
         self.scheduled_job = None
+        self.scheduler = None
+        self.run_inputs = None
         self.execution_thread = None
         self.is_running = False
+        self.prearm_thread = None
+        self.prepared_run = None
+        self.poller = None
+        self.log_sink = log_sink.LogSink()
+        self.online = None  # set by the connectivity check thread
+        self.startup_marks = [("window created", time.perf_counter())]
+        self.warm_up_thread = None
 
         # --- Load Assets ---
         bg_image_path = os.path.join("assets", "background.png")
@@ -45,20 +69,66 @@ class App(ctk.CTk):
         self.log_frame = None
         
         # --- Start Application Flow ---
-        self.after(100, self.check_internet_and_show_splash)
-        
-    def check_internet_and_show_splash(self):
+        # The splash stays up only until the connectivity check answers; nothing here blocks the Tk thread
+        self.show_splash_screen()
+        self.mark_startup("splash shown")
+        threading.Thread(target=self.check_internet, daemon=True).start()
+        self.warm_up_thread = threading.Thread(target=self.warm_up, daemon=True)
+        self.warm_up_thread.start()
+        self.after(self.STARTUP_POLL_MS, self.finish_startup)
+
+    def mark_startup(self, label):
+        self.startup_marks.append((label, time.perf_counter()))
+
+    def warm_up(self):
+        """Loads the heavy trading modules and the instrument index off the Tk thread."""
+        # Compile/load the instrument index now so symbol lookups cost nothing once the scan fires
         try:
-            requests.get("http://www.google.com", timeout=5)
-            self.show_splash_screen()
-        except (requests.ConnectionError, requests.Timeout):
-            ctk.CTkLabel(self, text="No Internet Connection.\nPlease connect and restart the app.", font=("Arial", 18, "bold")).pack(pady=200)
-    
+            instrument_index.load_index()
+        except FileNotFoundError:
+            # The trading script reports the missing equity.csv when it actually needs it.
+            pass
+        self.mark_startup("instrument index loaded")
+        # Importing is the warm-up: later imports on the Tk and scheduler threads become lookups
+        import trading_logic
+        import poller
+        self.mark_startup("trading modules loaded")
+
+    def check_internet(self):
+        """Runs on its own thread; finish_startup picks up the result."""
+        try:
+            socket.create_connection(CONNECTIVITY_CHECK, timeout=5).close()
+            self.online = True
+        except OSError:
+            self.online = False
+        self.mark_startup("connectivity checked")
+
     def show_splash_screen(self):
         self.splash_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.splash_frame.pack(expand=True, fill="both")
         ctk.CTkLabel(self.splash_frame, text="", image=self.logo_image).pack(pady=(150, 20))
-        self.after(4000, self.setup_credentials_or_main_ui)
+
+    def finish_startup(self):
+        if self.online is None:
+            self.after(self.STARTUP_POLL_MS, self.finish_startup)
+            return
+        if not self.online:
+            self.splash_frame.destroy()
+            ctk.CTkLabel(self, text="No Internet Connection.\nPlease connect and restart the app.", font=("Arial", 18, "bold")).pack(pady=200)
+            return
+        self.setup_credentials_or_main_ui()
+        self.update_idletasks()  # draw the form before taking the mark
+        self.mark_startup("interactive")
+        self.report_startup()
+
+    def report_startup(self):
+        """Logs how long each start-up step took once the background warm-up has finished too."""
+        if self.warm_up_thread.is_alive():
+            self.after(100, self.report_startup)
+            return
+        steps = ", ".join(f"{label} {(at - LAUNCHED_AT) * 1000:.0f} ms" for label, at in sorted(self.startup_marks, key=lambda mark: mark[1]))
+        interactive_ms = (dict(self.startup_marks)["interactive"] - LAUNCHED_AT) * 1000
+        self.log_sink(f"Startup: {steps}", stage="startup", latency_ms=interactive_ms)
 
     def setup_credentials_or_main_ui(self):
         if self.splash_frame:
@@ -115,7 +185,9 @@ class App(ctk.CTk):
             ("Total Amount (₹):", "amount_entry", "1000.00"),
             ("Profit Percent (%):", "profit_entry", "1.50"),
             ("Loss Percent (%):", "loss_entry", "1.00"),
-            ("Number of Stocks to Buy:", "stocks_entry", "2")
+            ("Number of Stocks to Buy:", "stocks_entry", "2"),
+            ("Pre-arm Seconds:", "prearm_entry", "30"),
+            ("Poll Every (s, 0 = once):", "poll_entry", "0")
         ]
         
         for label, attr, default in inputs:
@@ -126,10 +198,13 @@ class App(ctk.CTk):
             entry.pack(side="right")
             entry.insert(0, default)
             setattr(self, attr, entry)
+
+        self.bracket_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(self.main_frame, text="Use bracket orders where the instrument allows it", variable=self.bracket_var).pack(pady=(8, 0))
         
         # Time input
         time_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
-        time_frame.pack(pady=15)
+        time_frame.pack(pady=10)
         ctk.CTkLabel(time_frame, text="Execution Time:").pack(side="left", padx=5)
         self.hour_entry = ctk.CTkEntry(time_frame, width=40)
         self.hour_entry.pack(side="left")
@@ -143,7 +218,7 @@ class App(ctk.CTk):
         ctk.CTkOptionMenu(time_frame, variable=self.ampm_var, values=["AM", "PM"]).pack(side="left", padx=5)
 
         # Submit button
-        ctk.CTkButton(self.main_frame, text="Schedule Execution", command=self.schedule_execution, height=40, font=("Arial", 16)).pack(pady=20)
+        ctk.CTkButton(self.main_frame, text="Schedule Execution", command=self.schedule_execution, height=40, font=("Arial", 16)).pack(pady=15)
 
     def schedule_execution(self):
         try:
@@ -161,13 +236,35 @@ class App(ctk.CTk):
             
             if target_time < now:
                 target_time += timedelta(days=1)
-            
-            self.time_to_wait = (target_time - now).total_seconds()
-            self.main_frame.pack_forget()
-            self.show_countdown()
+
+            # Read every input now: the scheduler fires from its own thread, which must not touch Tk widgets
+            self.run_inputs = self.gather_run_inputs()
         except ValueError:
             # Simple error handling for invalid time input
-            pass
+            return
+
+        self.scheduler = scheduler.TriggerScheduler(
+            target_time,
+            on_trigger=self.start_script_execution,
+            on_prearm=self.start_prearm,
+            prearm_seconds=self.run_inputs["prearm_seconds"],
+            log_callback=self.log_sink,
+        ).start()
+        self.main_frame.pack_forget()
+        self.show_countdown()
+
+    def gather_run_inputs(self):
+        """Reads and validates the trade inputs. Raises ValueError on bad input."""
+        return {
+            "link": self.link_entry.get(),
+            "total_amount": float(self.amount_entry.get()),
+            "profit_percent": float(self.profit_entry.get()),
+            "loss_percent": float(self.loss_entry.get()),
+            "no_of_stocks": int(self.stocks_entry.get()),
+            "prearm_seconds": max(0.0, float(self.prearm_entry.get())),
+            "bracket_mode": self.bracket_var.get(),
+            "poll_interval": max(0.0, float(self.poll_entry.get())),
+        }
 
     def show_countdown(self):
         self.countdown_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -182,44 +279,89 @@ class App(ctk.CTk):
         self.update_countdown()
 
     def update_countdown(self):
-        if self.time_to_wait > 0:
-            mins, secs = divmod(self.time_to_wait, 60)
+        # Display only: the trade itself is fired by self.scheduler, not by this timer
+        remaining = self.scheduler.remaining()
+        if remaining > 0:
+            mins, secs = divmod(math.ceil(remaining), 60)
             hours, mins = divmod(mins, 60)
             timer_str = f"{int(hours):02}:{int(mins):02}:{int(secs):02}"
             self.countdown_label.configure(text=timer_str)
-            self.time_to_wait -= 1
-            self.scheduled_job = self.after(1000, self.update_countdown)
-        else:
-            self.start_script_execution()
+            self.scheduled_job = self.after(200, self.update_countdown)
+
+    def start_prearm(self):
+        """Warms up the session, instrument index and broker client in the background before T0."""
+        import trading_logic
+        inputs = self.run_inputs
+
+        def prearm():
+            self.prepared_run = trading_logic.prearm(inputs["link"], self.client_id, self.access_token, self.log_sink,
+                                                     warm_connections=inputs["no_of_stocks"])
+
+        self.prearm_thread = threading.Thread(target=prearm, daemon=True)
+        self.prearm_thread.start()
 
     def cancel_execution(self):
+        if self.scheduler:
+            self.scheduler.cancel()
+            self.scheduler = None
         if self.scheduled_job:
             self.after_cancel(self.scheduled_job)
             self.scheduled_job = None
+        if self.prearm_thread:
+            prearm_thread, self.prearm_thread = self.prearm_thread, None
+            threading.Thread(target=self.release_prepared_run, args=(prearm_thread,), daemon=True).start()
+        self.log_sink.drain(max_records=None)
         self.countdown_frame.destroy()
         self.main_frame.pack(expand=True, fill="both")
 
     def start_script_execution(self):
-        self.countdown_frame.destroy()
-        self.show_log_screen()
-        
+        """Called on the scheduler thread at T0: starts trading at once and switches the GUI afterwards."""
+        # Already loaded by warm_up, so these are dictionary lookups
+        import trading_logic
+        import poller
         self.is_running = True
-        
-        # Gather inputs from UI
-        link = self.link_entry.get()
-        total_amount = float(self.amount_entry.get())
-        profit_percent = float(self.profit_entry.get())
-        loss_percent = float(self.loss_entry.get())
-        no_of_stocks = int(self.stocks_entry.get())
-        
+        inputs = self.run_inputs
+        trigger_error = self.scheduler.trigger_error if self.scheduler else None
+        prearm_thread, self.prearm_thread = self.prearm_thread, None
+        if inputs["poll_interval"] > 0:
+            self.poller = poller.ScanPoller(inputs["link"], inputs["total_amount"], inputs["profit_percent"], inputs["loss_percent"],
+                                            inputs["no_of_stocks"], self.client_id, self.access_token, self.log_sink,
+                                            interval=inputs["poll_interval"], bracket_mode=inputs["bracket_mode"])
+
+        def run():
+            # Pre-arm normally finished long ago; if it is still going, wait rather than warm up twice.
+            prepared = None
+            if prearm_thread:
+                prearm_thread.join()
+                prepared, self.prepared_run = self.prepared_run, None
+            if self.poller:
+                # Day caps come from the same inputs; polling keeps the pre-armed session for every cycle
+                self.poller.run(prepared, trigger_error)
+                return
+            trading_logic.run_trading_script(inputs["link"], inputs["total_amount"], inputs["profit_percent"], inputs["loss_percent"],
+                                             inputs["no_of_stocks"], self.client_id, self.access_token, self.log_sink,
+                                             prepared=prepared, bracket_mode=inputs["bracket_mode"], trigger_error=trigger_error)
+
         # Run trading logic in a separate thread to not freeze the GUI
-        self.execution_thread = threading.Thread(
-            target=trading_logic.run_trading_script,
-            args=(link, total_amount, profit_percent, loss_percent, no_of_stocks, self.client_id, self.access_token, self.log_to_gui)
-        )
+        self.execution_thread = threading.Thread(target=run)
         self.execution_thread.daemon = True # Allows app to exit even if thread is running
         self.execution_thread.start()
 
+        self.after(0, self.show_run_screen)
+
+    def show_run_screen(self):
+        if self.scheduled_job:
+            self.after_cancel(self.scheduled_job)
+            self.scheduled_job = None
+        self.countdown_frame.destroy()
+        self.show_log_screen()
+
+    def release_prepared_run(self, prearm_thread):
+        prearm_thread.join()
+        prepared, self.prepared_run = self.prepared_run, None
+        if prepared:
+            prepared.close()
+
     def show_log_screen(self):
         self.log_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.log_frame.pack(expand=True, fill="both", padx=20, pady=20)
@@ -227,15 +369,25 @@ class App(ctk.CTk):
         self.log_textbox = ctk.CTkTextbox(self.log_frame, state="disabled", font=("Courier New", 12))
         self.log_textbox.pack(expand=True, fill="both")
 
-    def log_to_gui(self, message):
-        # This function is called from the trading thread, so we must use 'after' to update the GUI safely
-        def update_textbox():
+        if self.poller:
+            ctk.CTkButton(self.log_frame, text="Stop Polling", command=self.poller.cancel, fg_color="red", hover_color="darkred").pack(pady=(10, 0))
+
+        # Messages logged during pre-arm are still queued in the sink and show up on the first drain
+        self.drain_logs()
+
+    def drain_logs(self):
+        """Moves everything queued since the last frame into the textbox with a single insert."""
+        records = self.log_sink.drain()
+        if records:
             self.log_textbox.configure(state="normal")
-            self.log_textbox.insert("end", message + "\n")
+            self.log_textbox.insert("end", "".join(record.message + "\n" for record in records))
+            # Ring buffer: drop the oldest lines once the view holds more than MAX_LOG_LINES
+            line_count = int(self.log_textbox.index("end-1c").split(".")[0])
+            if line_count > self.MAX_LOG_LINES:
+                self.log_textbox.delete("1.0", f"{line_count - self.MAX_LOG_LINES + 1}.0")
             self.log_textbox.see("end") # Auto-scroll to the bottom
             self.log_textbox.configure(state="disabled")
-        
-        self.after(0, update_textbox)
+        self.after(self.LOG_FRAME_MS, self.drain_logs)
 
 if __name__ == "__main__":
     app = App()
@@ -0,0 +1,128 @@
+# file: poller.py
+import time
+import threading
+from datetime import datetime, time as dt_time
+
+import log_sink
+import tracing
+import order_tracker
+import trading_logic
+
+DEFAULT_POLL_INTERVAL = 60.0
+
+# New intraday entries stop well before the broker's auto square-off.
+DEFAULT_WINDOW_END = dt_time(15, 15)
+
+
+class ScanPoller:
+    """Re-runs the screener every `interval` seconds until `end_time` and trades only symbols it has not seen today.
+
+    `total_amount` and `no_of_stocks` are caps for the whole day rather than per poll: each stock gets
+    total_amount / no_of_stocks, and polling stops once either cap is used up. Every poll reuses the
+    same pre-armed Chartink session, instrument index and broker gateway, so a cycle costs one scan
+    request plus the orders for whatever is new.
+    """
+
+    def __init__(self, link, total_amount, profit_percent, loss_percent, no_of_stocks, CLIENT_ID, ACCESS_TOKEN, log_callback,
+                 interval=DEFAULT_POLL_INTERVAL, end_time=None, bracket_mode=False, broker_url=None,
+                 order_feed_url=order_tracker.DHAN_ORDER_FEED_URL, **run_options):
+        self.link = link
+        self.total_amount = total_amount
+        self.profit_percent = profit_percent
+        self.loss_percent = loss_percent
+        self.no_of_stocks = no_of_stocks
+        self.client_id = CLIENT_ID
+        self.access_token = ACCESS_TOKEN
+        self.log_callback = log_sink.adapt(log_callback)
+        self.interval = max(1.0, interval)
+        self.end_time = end_time or datetime.combine(datetime.now().date(), DEFAULT_WINDOW_END)
+        self.bracket_mode = bracket_mode
+        self.broker_url = broker_url
+        self.order_feed_url = order_feed_url
+        self.run_options = run_options  # passed through to run_trading_script (max_in_flight, orders_per_second)
+
+        self.day = None
+        self.seen_symbols = set()
+        self.symbols_traded = 0
+        self.capital_used = 0.0
+        self.polls = 0
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    def start(self, prepared=None, trigger_error=None):
+        self._thread = threading.Thread(target=self.run, args=(prepared, trigger_error), daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def amount_per_stock(self):
+        return self.total_amount / self.no_of_stocks if self.no_of_stocks else 0.0
+
+    def _reset_day(self, today):
+        self.day = today
+        self.seen_symbols = set()
+        self.symbols_traded = 0
+        self.capital_used = 0.0
+
+    def _caps_reached(self):
+        return (self.symbols_traded >= self.no_of_stocks
+                or self.total_amount - self.capital_used < self.amount_per_stock)
+
+    def run(self, prepared=None, trigger_error=None):
+        """Polls until the window closes, the day caps are used up or cancel() is called. Blocks the calling thread."""
+        if prepared is None:
+            prepared = trading_logic.prearm(self.link, self.client_id, self.access_token, self.log_callback,
+                                            warm_connections=self.no_of_stocks, broker_url=self.broker_url,
+                                            order_feed_url=self.order_feed_url)
+        if prepared.chartink_session is None:
+            self.log_callback("--> WARNING: No Chartink HTTP session. Every poll will have to start the browser.")
+        self.log_callback(f"Polling the screener every {self.interval:.0f} s until {self.end_time:%H:%M} "
+                          f"(day caps: {self.no_of_stocks} stocks, ₹{self.total_amount:.2f}).", stage="poll")
+
+        next_poll = time.perf_counter()
+        try:
+            while not self._cancelled.is_set():
+                if datetime.now() >= self.end_time:
+                    self.log_callback("Polling window closed.", stage="poll")
+                    break
+                self.poll(prepared, trigger_error)
+                trigger_error = None  # only the first poll was fired by the scheduler
+                if self._caps_reached():
+                    self.log_callback(f"Day caps reached ({self.symbols_traded} stocks, ₹{self.capital_used:.2f} committed). "
+                                      "Polling stopped.", stage="poll")
+                    break
+
+                # Fixed cadence on the monotonic clock; a poll that overruns skips the slots it missed.
+                now = time.perf_counter()
+                next_poll += self.interval
+                if next_poll < now:
+                    next_poll += (now - next_poll) // self.interval * self.interval + self.interval
+                if self._cancelled.wait(next_poll - now):
+                    self.log_callback("Polling cancelled.", stage="poll")
+                    break
+        finally:
+            prepared.close()
+
+    def poll(self, prepared, trigger_error=None):
+        """Runs one scan and places orders for the new hits, within what is left of today's caps."""
+        today = datetime.now().date()
+        if today != self.day:
+            self._reset_day(today)
+        if self.polls:
+            prepared.tracer = tracing.Tracer()  # one run-history entry per poll
+        self.polls += 1
+
+        slots = self.no_of_stocks - self.symbols_traded
+        budget = min(self.total_amount - self.capital_used, self.amount_per_stock * slots)
+        plans = trading_logic.run_trading_script(self.link, budget, self.profit_percent, self.loss_percent, slots,
+                                                 self.client_id, self.access_token, self.log_callback, prepared=prepared,
+                                                 bracket_mode=self.bracket_mode, trigger_error=trigger_error,
+                                                 seen_symbols=self.seen_symbols, keep_prepared=True, **self.run_options)
+        # Committed capital counts every plan handed to the broker, filled or not, so the cap is never overshot.
+        for plan in plans:
+            self.symbols_traded += 1
+            self.capital_used += plan.quantity * plan.price
+        return plans
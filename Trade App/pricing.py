@@ -0,0 +1,74 @@
+# file: pricing.py
+from collections import namedtuple
+
+import numpy as np
+
+# Used for symbols missing from the instrument master; NSE equities mostly trade in 5 paise steps.
+DEFAULT_TICK = 0.05
+
+# The Stop-Loss limit sits this many percent below its trigger so the exit still fills in a fast move.
+STOP_LIMIT_BUFFER_PERCENT = 0.2
+
+# Live quotes must arrive within this many seconds, or the basket is sized from the scan prices instead.
+DEFAULT_QUOTE_BUDGET = 0.3
+
+# Per-symbol arrays for a whole basket, all in the scan's rank order.
+# profit_distance/stop_distance are the bracket-order offsets from the entry price.
+BasketPrices = namedtuple("BasketPrices", ["price", "quantity", "stop_trigger", "stop_limit", "target", "profit_distance", "stop_distance"])
+
+
+def round_to_tick(prices, tick=DEFAULT_TICK):
+    """Rounds prices to the nearest tick, cleaning float noise so the broker sees e.g. 101.35, not 101.35000000000001."""
+    return np.round(np.round(np.asarray(prices, dtype=float) / tick) * tick, 2)
+
+
+def allocate(prices, amount_per_stock, lot_sizes=1):
+    """Share quantities, in whole lots, for an equal `amount_per_stock` split of the basket.
+
+    The cash that whole-lot rounding leaves over on the bought symbols is then spent in rank order,
+    at most one extra lot per symbol, so no position exceeds amount_per_stock plus one lot. The share
+    of a symbol that cannot be bought (too expensive, or no usable price) is not passed on to the
+    others. The basket never spends more than amount_per_stock * len(prices).
+    """
+    prices = np.asarray(prices, dtype=float)
+    lot_sizes = np.broadcast_to(np.asarray(lot_sizes, dtype=np.int64), prices.shape)
+    lot_cost = prices * lot_sizes
+    # A missing or bad price (NaN, zero, negative) gets no lots; casting its NaN/inf share would overflow the quantity.
+    valid = np.isfinite(lot_cost) & (lot_cost > 0)
+    lot_cost = np.where(valid, lot_cost, 0.0)
+    lots = np.zeros(prices.shape, dtype=np.int64)
+    lots[valid] = np.floor(amount_per_stock / lot_cost[valid])
+
+    held = np.flatnonzero(lots > 0)
+    leftover = amount_per_stock * len(held) - float((lots[held] * lot_cost[held]).sum())
+    # One pass over the held symbols, so the cost does not grow with the amount of cash.
+    for i in held:
+        if lot_cost[i] <= leftover:
+            lots[i] += 1
+            leftover -= lot_cost[i]
+    return lots * lot_sizes
+
+
+def exit_levels(prices, profit_percent, loss_percent, ticks=DEFAULT_TICK):
+    """Stop-Loss trigger/limit, Target and bracket offsets for entries at `prices`, each rounded to its tick.
+
+    Returns (stop_trigger, stop_limit, target, profit_distance, stop_distance) arrays.
+    """
+    prices = np.asarray(prices, dtype=float)
+    ticks = np.broadcast_to(np.asarray(ticks, dtype=float), prices.shape)
+    return (
+        round_to_tick(prices * (1 - loss_percent / 100), ticks),
+        round_to_tick(prices * (1 - (loss_percent + STOP_LIMIT_BUFFER_PERCENT) / 100), ticks),
+        round_to_tick(prices * (1 + profit_percent / 100), ticks),
+        round_to_tick(prices * (profit_percent / 100), ticks),
+        round_to_tick(prices * (loss_percent / 100), ticks),
+    )
+
+
+def price_basket(prices, amount_per_stock, profit_percent, loss_percent, ticks=DEFAULT_TICK, lot_sizes=1):
+    """Sizes every symbol and prices its Stop-Loss, Target and bracket offsets in one vectorised pass.
+
+    `ticks` and `lot_sizes` are per-symbol arrays (or one value for all) from the instrument master.
+    """
+    prices = np.asarray(prices, dtype=float)
+    return BasketPrices(prices, allocate(prices, amount_per_stock, lot_sizes), *exit_levels(prices, profit_percent, loss_percent, ticks))
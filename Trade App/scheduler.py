@@ -0,0 +1,127 @@
+# file: scheduler.py
+import time
+import socket
+import struct
+import threading
+
+DEFAULT_TIME_SOURCE = "time.google.com"
+
+# Windows sleeps in ~15.6 ms steps, so the last stretch before the deadline is busy-waited instead.
+DEFAULT_SPIN_WINDOW = 0.020
+
+# Seconds between the NTP epoch (1900) and the Unix epoch (1970).
+NTP_EPOCH_OFFSET = 2208988800
+
+
+def _ntp_to_unix(seconds, fraction):
+    return seconds - NTP_EPOCH_OFFSET + fraction / 2**32
+
+
+def measure_clock_offset(server=DEFAULT_TIME_SOURCE, timeout=1.0):
+    """Queries an NTP server once (SNTP) and returns (offset, round_trip) in seconds.
+
+    `offset` is what must be added to the local wall clock to get the server's time.
+    """
+    packet = b"\x1b" + 47 * b"\0"  # LI = 0, version 3, mode 3 (client)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sent = time.time()
+        sock.sendto(packet, (server, 123))
+        data, _ = sock.recvfrom(48)
+        received = time.time()
+    if len(data) < 48:
+        raise OSError("short NTP response")
+
+    server_received = _ntp_to_unix(*struct.unpack("!II", data[32:40]))
+    server_sent = _ntp_to_unix(*struct.unpack("!II", data[40:48]))
+    offset = ((server_received - sent) + (server_sent - received)) / 2
+    round_trip = (received - sent) - (server_sent - server_received)
+    return offset, round_trip
+
+
+class TriggerScheduler:
+    """Fires `on_trigger` at a wall-clock time on its own thread, independent of the GUI event loop.
+
+    The target is converted once into a deadline on time.perf_counter(), which is monotonic and, unlike
+    time.monotonic() on older Windows Pythons, has sub-microsecond resolution. The thread sleeps
+    coarsely until `spin_window` before the deadline and then spins, so it fires within about a
+    millisecond. `on_prearm` (optional) is called `prearm_seconds` before the trigger.
+    """
+
+    def __init__(self, target_time, on_trigger, on_prearm=None, prearm_seconds=0.0, time_source=DEFAULT_TIME_SOURCE,
+                 spin_window=DEFAULT_SPIN_WINDOW, log_callback=None):
+        self.target_time = target_time
+        self.on_trigger = on_trigger
+        self.on_prearm = on_prearm
+        self.prearm_seconds = max(0.0, prearm_seconds)
+        self.time_source = time_source
+        self.spin_window = spin_window
+        self.log_callback = log_callback or (lambda message: None)
+
+        self.clock_offset = 0.0
+        self.trigger_error = None  # seconds the trigger fired after the target (negative = early)
+        self._deadline = None
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._set_deadline()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def remaining(self):
+        """Seconds until the trigger, for display only."""
+        if self._deadline is None:
+            return max(0.0, self.target_time.timestamp() - time.time())
+        return max(0.0, self._deadline - time.perf_counter())
+
+    def _set_deadline(self):
+        # Map the wall-clock target onto the perf_counter timeline once; from here on only the
+        # monotonic clock is used, so NTP slews or manual clock changes cannot move the trigger.
+        now_wall = time.time() + self.clock_offset
+        now_mono = time.perf_counter()
+        self._deadline = now_mono + (self.target_time.timestamp() - now_wall)
+
+    def _sync_clock(self):
+        if not self.time_source:
+            return
+        try:
+            self.clock_offset, round_trip = measure_clock_offset(self.time_source)
+        except OSError as e:
+            self.log_callback(f"--> WARNING: Could not reach time source {self.time_source} ({e}). Using the local clock.")
+            return
+        self.log_callback(f"Local clock offset vs {self.time_source}: {self.clock_offset * 1000:+.1f} ms "
+                          f"(round trip {round_trip * 1000:.1f} ms)")
+        self._set_deadline()
+
+    def _wait_until(self, deadline):
+        """Sleeps coarsely, then spins. Returns False if the scheduler was cancelled."""
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= self.spin_window:
+                break
+            # Re-check periodically rather than sleeping the whole gap, so a long wait stays cancellable.
+            if self._cancelled.wait(min(remaining - self.spin_window, 1.0)):
+                return False
+        while time.perf_counter() < deadline:
+            pass
+        return not self._cancelled.is_set()
+
+    def _run(self):
+        self._sync_clock()
+
+        if self.on_prearm is not None:
+            if not self._wait_until(self._deadline - self.prearm_seconds):
+                return
+            self.on_prearm()
+
+        if not self._wait_until(self._deadline):
+            return
+        fired = time.perf_counter()
+        self.trigger_error = fired - self._deadline
+        self.on_trigger()
+        self.log_callback(f"Trigger fired {self.trigger_error * 1000:+.3f} ms from the target time.")
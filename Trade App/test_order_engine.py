@@ -0,0 +1,62 @@
+# file: test_order_engine.py
+import time
+import threading
+
+import broker
+import mock_servers
+import order_engine
+from order_engine import OrderPlan
+
+
+def test_reserve_never_lets_more_than_rate_orders_into_one_period():
+    limiter = order_engine.RateLimiter(5, period=0.2)
+    slots = []
+    slots_lock = threading.Lock()
+
+    def reserve_many():
+        for _ in range(20):
+            slot = time.monotonic() + limiter.reserve()
+            with slots_lock:
+                slots.append(slot)
+
+    threads = [threading.Thread(target=reserve_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 80 orders at 5 per 0.2 s: any 6 consecutive send times must span at least one period.
+    slots.sort()
+    assert len(slots) == 80
+    assert all(slots[i + 5] - slots[i] >= 0.2 - 1e-3 for i in range(len(slots) - 5))
+
+
+def test_reserve_allows_a_full_burst_at_the_start():
+    limiter = order_engine.RateLimiter(5, period=0.2)
+    assert [limiter.reserve() for _ in range(5)] == [0, 0, 0, 0, 0]
+    assert limiter.reserve() > 0
+
+
+def test_get_rate_limiter_shares_one_limiter_per_account_at_the_lowest_rate():
+    first = order_engine.get_rate_limiter("TEST-SHARED", 20)
+    second = order_engine.get_rate_limiter("TEST-SHARED", 10)
+    assert first is second
+    assert first.rate == 10
+    assert order_engine.get_rate_limiter("TEST-OTHER", 20) is not first
+
+
+def test_two_engines_on_one_account_stay_under_the_broker_limit():
+    client_id = "1000000002"
+    with mock_servers.MockDhanServer(orders_per_second=10, client_id=client_id, order_feed=True) as dhan_server:
+        gateway = broker.BrokerGateway(client_id, "token", 8, dhan_server.base_url)
+        limiter = order_engine.get_rate_limiter(client_id, 10)
+        plans = [OrderPlan(i, "TEST %d" % i, "TEST%d" % i, str(1000 + i), 1, 99.0, 98.8, 101.5, price=100.0) for i in range(4)]
+        # Two runs of 4 symbols x 3 legs each: 24 orders, well over one second's allowance.
+        engines = [order_engine.OrderEngine(gateway, lambda message, **fields: None, orders_per_second=10, limiter=limiter) for _ in range(2)]
+        threads = [threading.Thread(target=engine.run, args=(plans,)) for engine in engines]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(dhan_server.orders) == 24
+        assert dhan_server.rate_limited == 0
@@ -0,0 +1,90 @@
+# file: test_order_tracker.py
+import time
+import threading
+
+import broker
+import mock_servers
+import order_tracker
+from order_engine import OrderPlan, STOP_LOSS, TARGET
+
+CLIENT_ID = "1000000001"
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class HeldCancelGateway:
+    """The real gateway, except that cancels wait until `release` is set."""
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.release = threading.Event()
+
+    def cancel_order(self, order_id):
+        self.release.wait(5)
+        return self.gateway.cancel_order(order_id)
+
+
+def start_tracker(dhan_server, gateway):
+    messages = []
+    tracker = order_tracker.OrderTracker(gateway, lambda message, **fields: messages.append(message))
+    tracker.stream = order_tracker.OrderUpdateStream(CLIENT_ID, "token", tracker.on_message, dhan_server.order_feed_url).start()
+    assert tracker.stream.connected.wait(5)
+    return tracker, messages
+
+
+def place_exits(gateway, plan):
+    stop_id = gateway.place_stop_loss(plan.security_id, plan.quantity, plan.stop_trigger, plan.stop_limit)["data"]["orderId"]
+    target_id = gateway.place_target(plan.security_id, plan.quantity, plan.target)["data"]["orderId"]
+    return stop_id, target_id
+
+
+PLAN = OrderPlan(0, "TEST LTD", "TEST", "1333", 10, 99.0, 98.8, 101.5, price=100.0, entry_order_id="ENTRY-1")
+
+
+def test_second_exit_leg_is_cancelled_when_the_first_filled_before_it_was_registered():
+    with mock_servers.MockDhanServer(order_feed=True) as dhan_server:
+        gateway = broker.BrokerGateway(CLIENT_ID, "token", 2, dhan_server.base_url)
+        tracker, messages = start_tracker(dhan_server, gateway)
+        try:
+            stop_id, target_id = place_exits(gateway, PLAN)
+            tracker.register(PLAN, STOP_LOSS, stop_id)
+            assert dhan_server.fill(stop_id)
+            assert wait_for(lambda: tracker.get(stop_id).status == "TRADED")
+
+            tracker.register(PLAN, TARGET, target_id)
+            assert wait_for(lambda: dhan_server.order_status[target_id] == "CANCELLED")
+            assert wait_for(lambda: tracker.cancels == 1)
+            assert wait_for(lambda: tracker.get(target_id).status == "CANCELLED")
+            assert tracker.open_orders() == []
+        finally:
+            tracker.stream.stop()
+
+
+def test_both_exit_legs_filling_is_reported_and_nothing_is_cancelled():
+    with mock_servers.MockDhanServer(order_feed=True) as dhan_server:
+        gateway = broker.BrokerGateway(CLIENT_ID, "token", 2, dhan_server.base_url)
+        held = HeldCancelGateway(gateway)
+        tracker, messages = start_tracker(dhan_server, held)
+        try:
+            stop_id, target_id = place_exits(gateway, PLAN)
+            tracker.register(PLAN, STOP_LOSS, stop_id)
+            tracker.register(PLAN, TARGET, target_id)
+            # The Target fills while the cancel triggered by the Stop-Loss fill is still on its way.
+            assert dhan_server.fill(stop_id)
+            assert dhan_server.fill(target_id)
+            assert wait_for(lambda: tracker.get(target_id).status == "TRADED")
+            held.release.set()
+
+            assert wait_for(lambda: any("Could not cancel" in message for message in messages))
+            assert any("Both exit legs of TEST LTD filled" in message for message in messages)
+            assert tracker.cancels == 0
+            assert dhan_server.order_status[stop_id] == dhan_server.order_status[target_id] == "TRADED"
+        finally:
+            tracker.stream.stop()
@@ -0,0 +1,55 @@
+# file: test_pricing.py
+import time
+
+import numpy as np
+
+import pricing
+
+
+def test_allocate_floors_to_whole_lots_and_redistributes_leftover_in_rank_order():
+    # 1000 each: 3 x 300 leaves 100, 1 x 700 leaves 300, 4 x 250 leaves 0. The 400 left over buys one
+    # more 300 share for the top-ranked symbol; the 100 remaining cannot buy anything else.
+    quantities = pricing.allocate([300.0, 700.0, 250.0], 1000)
+    assert quantities.tolist() == [4, 1, 4]
+
+
+def test_allocate_does_not_pass_an_unbought_share_to_other_symbols():
+    # The 5000 stock gets nothing, and its 1000 share is not spent on the 100 stock either.
+    quantities = pricing.allocate([100.0, 5000.0], 1000)
+    assert quantities.tolist() == [10, 0]
+
+
+def test_allocate_caps_each_position_at_its_share_plus_one_lot():
+    prices = np.array([1.2, 480.0, 130000.0, 95000.0, 27000.0])
+    quantities = pricing.allocate(prices, 20000)
+    assert (quantities * prices <= 20000 + prices).all()
+    assert quantities.tolist() == [16667, 41, 0, 0, 0]
+
+
+def test_allocate_never_exceeds_the_basket_budget():
+    prices = np.array([123.45, 67.8, 999.95, 12.35, 450.0])
+    lot_sizes = np.array([1, 5, 1, 10, 2])
+    quantities = pricing.allocate(prices, 2000, lot_sizes)
+    assert (quantities % lot_sizes == 0).all()
+    assert (quantities * prices <= 2000 + prices * lot_sizes).all()
+    assert float((quantities * prices).sum()) <= 2000 * len(prices)
+
+
+def test_allocate_cost_does_not_grow_with_the_cash():
+    start = time.perf_counter()
+    pricing.allocate([0.85, 130000.0], 100000)
+    pricing.allocate([0.5] + [1e7] * 9, 1e6)
+    assert time.perf_counter() - start < 0.1
+
+
+def test_allocate_skips_missing_and_non_positive_prices():
+    quantities = pricing.allocate([np.nan, 0.0, -5.0, np.inf, 100.0], 1000)
+    assert quantities.dtype == np.int64
+    assert quantities.tolist() == [0, 0, 0, 0, 10]
+
+
+def test_price_basket_with_a_missing_price_sizes_it_to_zero():
+    basket = pricing.price_basket([None, 200.0], 1000, 1.5, 1.0)
+    assert basket.quantity.tolist() == [0, 5]
+    assert basket.target[1] == 203.0
+    assert basket.stop_trigger[1] == 198.0
@@ -0,0 +1,132 @@
+# file: tracing.py
+import sys
+import time
+import uuid
+import argparse
+import threading
+from datetime import date
+from contextlib import contextmanager
+from collections import namedtuple, defaultdict
+
+import database
+
+# start_ms is measured from the moment the Tracer was created, on the perf_counter (monotonic) clock.
+Span = namedtuple("Span", ["name", "symbol", "start_ms", "duration_ms"])
+
+# Prefix shared by every span recorded before the trigger.
+PREARM_PREFIX = "prearm."
+
+
+class Tracer:
+    """Collects timed spans for one execution, from pre-arm to the last order acknowledgement."""
+
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.attributes = {}  # run-level facts such as the link or the trigger error
+        self.spans = []
+        self._origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def now_ms(self):
+        return (time.perf_counter_ns() - self._origin) / 1e6
+
+    def record(self, name, start_ms, end_ms, symbol=None):
+        with self._lock:
+            self.spans.append(Span(name, symbol, start_ms, end_ms - start_ms))
+
+    @contextmanager
+    def span(self, name, symbol=None):
+        start = self.now_ms()
+        try:
+            yield
+        finally:
+            self.record(name, start, self.now_ms(), symbol)
+
+    def total_ms(self, prefix):
+        """Summed duration of the run-level spans whose name starts with `prefix`."""
+        return sum(span.duration_ms for span in self.spans if span.name.startswith(prefix) and span.symbol is None)
+
+    def format(self, prefix="", exclude=None):
+        """'name 12 ms, name 3 ms' for the run-level spans under `prefix` (minus `exclude`), in recording order."""
+        return ", ".join(f"{span.name[len(prefix):]} {span.duration_ms:.0f} ms"
+                         for span in self.spans
+                         if span.name.startswith(prefix) and span.symbol is None and not (exclude and span.name.startswith(exclude)))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def stage_summary(spans):
+    """Groups (name, duration_ms) pairs by stage and returns {stage: (count, p50, p90, p99, max)}."""
+    by_stage = defaultdict(list)
+    for name, duration_ms in spans:
+        by_stage[name].append(duration_ms)
+    return {
+        name: (len(values), percentile(values, 50), percentile(values, 90), percentile(values, 99), max(values))
+        for name, values in by_stage.items()
+    }
+
+
+def print_report(runs=20, out=sys.stdout):
+    """Prints the latest run's breakdown and per-stage percentiles across the last `runs` runs."""
+    history = database.get_run_history(runs)
+    if not history:
+        print("No runs recorded yet.", file=out)
+        return
+
+    latest = history[0]
+    print(f"Latest run {latest['run_id'][:8]} at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(latest['started_at']))}"
+          f" ({latest['status']}, trigger error {_format_ms(latest['trigger_error_ms'])})", file=out)
+    for name, symbol, start_ms, duration_ms in latest["spans"]:
+        label = f"{name} [{symbol}]" if symbol else name
+        print(f"  {label:<40} +{start_ms:>10.1f} ms  {duration_ms:>9.1f} ms", file=out)
+
+    print(f"\nStage percentiles over the last {len(history)} run(s):", file=out)
+    print(f"  {'stage':<24}{'count':>7}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}", file=out)
+    summary = stage_summary((name, duration_ms) for run in history for name, _, _, duration_ms in run["spans"])
+    for name in sorted(summary):
+        count, p50, p90, p99, worst = summary[name]
+        print(f"  {name:<24}{count:>7}{p50:>10.1f}{p90:>10.1f}{p99:>10.1f}{worst:>10.1f}", file=out)
+
+    errors = [run["trigger_error_ms"] for run in history if run["trigger_error_ms"] is not None]
+    if errors:
+        print(f"\nTrigger error: p50 {percentile(errors, 50):+.3f} ms, max {max(errors, key=abs):+.3f} ms", file=out)
+
+
+def print_day_report(day, out=sys.stdout):
+    """Prints every position opened on `day` with the outcome of its broker legs."""
+    rows = database.get_day_report(day)
+    if not rows:
+        print(f"No orders recorded on {day:%Y-%m-%d}.", file=out)
+        return
+    print(f"Orders on {day:%Y-%m-%d}:", file=out)
+    print(f"  {'symbol':<16}{'qty':>7}{'price':>11}{'capital':>13}{'legs':>6}{'failed':>8}{'traded':>8}{'cancelled':>11}{'avg ms':>9}", file=out)
+    for row in rows:
+        latency = f"{row['avg_latency_ms']:.1f}" if row["avg_latency_ms"] is not None else "n/a"
+        print(f"  {row['symbol']:<16}{row['quantity']:>7}{row['price']:>11.2f}{row['capital']:>13.2f}{row['legs']:>6}"
+              f"{row['failed']:>8}{row['traded']:>8}{row['cancelled']:>11}{latency:>9}", file=out)
+    print(f"  {len(rows)} position(s), ₹{sum(row['capital'] for row in rows):.2f} committed", file=out)
+
+
+def _format_ms(value):
+    return "n/a" if value is None else f"{value:+.3f} ms"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show per-stage latency and orders for past trading runs.")
+    parser.add_argument("--runs", type=int, default=20, help="number of most recent runs to summarise")
+    parser.add_argument("--day", type=date.fromisoformat, help="list the orders placed on this date (YYYY-MM-DD) instead")
+    args = parser.parse_args(argv)
+    if args.day:
+        print_day_report(args.day)
+    else:
+        print_report(args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,157 +1,298 @@
 # file: trading_logic.py
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
 import pandas as pd
-from selenium import webdriver
-from dhanhq.dhanhq import dhanhq
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from selenium.webdriver.support import expected_conditions as EC
 
-# This is the main function that the GUI will call.
-def run_trading_script(link, total_amount, profit_percent, loss_percent, no_of_stocks_to_buy, CLIENT_ID, ACCESS_TOKEN, log_callback):
+import broker
+import chartink
+import instrument_index
+import log_sink
+import order_engine
+import order_tracker
+import pricing
+import tracing
+import database
+
+# --- Pre-arm: everything that can be done before the trigger time ---
+
+class PreparedRun:
+    """Holds the resources warmed up ahead of the trigger so only the scan and the orders remain at T0."""
+
+    def __init__(self, link):
+        self.link = link
+        self.index = None
+        self.chartink_session = None
+        self.driver = None
+        self.gateway = None
+        self.tracker = None
+        self.tracer = tracing.Tracer()  # spans of this run, starting with the pre-arm stages
+
+    def close(self):
+        """Releases the browser if the run is cancelled before it uses it."""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+
+def open_browser(link, log_callback):
+    """Starts headless Chrome and loads the screener page. Returns the driver, or None on failure."""
+    # Selenium is only needed when the HTTP session is unavailable, so it is not imported at startup.
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    log_callback("Initializing browser to fetch data from Chartink...")
+    chromedriver_path = os.path.join(os.getcwd(), "drivers", "chromedriver.exe")
     
+    if not os.path.exists(chromedriver_path):
+        log_callback(f"FATAL ERROR: chromedriver.exe not found in '{os.path.join(os.getcwd(), 'drivers')}'")
+        return None
+
+    options = webdriver.ChromeOptions()
+    # Run Chrome in "headless" mode so the user doesn't see a browser window
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    prefs = {"download.default_directory": os.getcwd(), "download.prompt_for_download": False, "directory_upgrade": True}
+    options.add_experimental_option("prefs", prefs)
+    
+    driver = None
+    try:
+        service = Service(chromedriver_path)
+        driver = webdriver.Chrome(service=service, options=options)
+        driver.get(link)
+        return driver
+    except Exception as e:
+        log_callback(f"FATAL ERROR during browser operation: {e}")
+        if driver:
+            driver.quit()
+        return None
+
+
+def prearm(link, CLIENT_ID, ACCESS_TOKEN, log_callback, fetch_mode="http", warm_connections=1, pool_size=broker.DEFAULT_POOL_SIZE,
+           broker_url=None, order_feed_url=order_tracker.DHAN_ORDER_FEED_URL):
+    """Loads the instrument index, opens the screener session and authenticates the broker gateway.
+
+    broker_url points the gateway at another DhanHQ-compatible endpoint, such as the local stand-in, and
+    order_feed_url does the same for the order-update stream (None turns Stop-Loss/Target pairing off).
+    """
+    log_callback = log_sink.adapt(log_callback)
+    prepared = PreparedRun(link)
+    tracer = prepared.tracer
+
+    with tracer.span("prearm.index"):
+        try:
+            prepared.index = instrument_index.load_index()
+        except FileNotFoundError:
+            log_callback("FATAL ERROR: equity.csv not found! Please place it in the application folder.")
+
+    if fetch_mode == "http":
+        with tracer.span("prearm.chartink_session"):
+            session = chartink.get_session(link)
+            try:
+                session.prepare()
+                prepared.chartink_session = session
+            except chartink.ChartinkError as e:
+                log_callback(f"--> WARNING: Could not open the Chartink HTTP session ({e}). The browser will be used instead.")
+
+    if prepared.chartink_session is None:
+        with tracer.span("prearm.browser"):
+            prepared.driver = open_browser(link, log_callback)
+
+    with tracer.span("prearm.broker_login"):
+        prepared.gateway = broker.get_gateway(CLIENT_ID, ACCESS_TOKEN, pool_size, broker_url)
+        # Cheap authenticated calls validate the token and leave warm TLS connections in the session pool.
+        response = prepared.gateway.warm(warm_connections)
+        if not response or response.get("status") != "success":
+            log_callback(f"--> WARNING: Broker login check failed: {response.get('remarks', 'N/A') if response else 'N/A'}")
+
+    if order_feed_url:
+        with tracer.span("prearm.order_feed"):
+            # Connects in the background; updates that arrive before an order is registered are held for it.
+            prepared.tracker = order_tracker.get_tracker(prepared.gateway, CLIENT_ID, ACCESS_TOKEN, log_callback, order_feed_url,
+                                                         database.get_store())
+
+    prearm_ms = tracer.total_ms(tracing.PREARM_PREFIX)
+    log_callback(f"Pre-arm finished in {prearm_ms:.0f} ms ({tracer.format(tracing.PREARM_PREFIX)})", stage="pre-arm", latency_ms=prearm_ms)
+    return prepared
+
+# This is the main function that the GUI will call.
+# fetch_mode "http" queries the screener directly; "selenium" forces the old headless-browser CSV download.
+# Pass the result of prearm() as `prepared` to skip all warm-up work after the trigger.
+# max_in_flight bounds concurrent broker calls; orders_per_second matches the broker's order rate limit.
+# bracket_mode sends entry, stop and target as one bracket order for instruments whose BO ranges allow it.
+# trigger_error (seconds late, from the scheduler) is stored with the run's latency spans.
+# seen_symbols (a set) skips scan hits already handled by an earlier run and is updated with this run's picks.
+# keep_prepared leaves `prepared` open so the next run can reuse it.
+# quote_budget (seconds) bounds the live-quote refresh before sizing; 0 sizes straight from the scan prices.
+# broker_url/order_feed_url are passed to prearm() when `prepared` is None, so a dry run never falls back to the live broker.
+# Returns the order plans that were sent to the broker.
+def run_trading_script(link, total_amount, profit_percent, loss_percent, no_of_stocks_to_buy, CLIENT_ID, ACCESS_TOKEN, log_callback, fetch_mode="http", prepared=None,
+                       max_in_flight=order_engine.DEFAULT_MAX_IN_FLIGHT, orders_per_second=order_engine.DHAN_ORDERS_PER_SECOND,
+                       bracket_mode=False, trigger_error=None, seen_symbols=None, keep_prepared=False,
+                       quote_budget=pricing.DEFAULT_QUOTE_BUDGET, broker_url=None, order_feed_url=order_tracker.DHAN_ORDER_FEED_URL):
+    log_callback = log_sink.adapt(log_callback)
+    store = database.get_store()  # every write below is queued for the store's writer thread
+
     # --- Helper and Core Logic Functions (Nested for encapsulation) ---
 
-    def round_to_tick(price, tick=0.05):
-        return round(price / tick) * tick
+    def record(call, *args):
+        """Runs one store call. Recording is best-effort and must never stop a trade."""
+        try:
+            call(*args)
+        except Exception as e:
+            log_callback(f"--> WARNING: Could not record this run in the database ({e}).", stage="store")
+
+    def build_order_plan(rank, seq_id, name, symbol, basket):
+        """Turns row `rank` of the priced basket into an order plan. Returns None if it cannot be bought."""
+        quantity = int(basket.quantity[rank])
+        if not basket.price[rank] > 0:  # also catches NaN
+            log_callback(f"--> WARNING: No valid price for {name} ({basket.price[rank]}). Skipping.", stage="sizing", symbol=symbol)
+            return None
+        if quantity <= 0:
+            log_callback(f"Stock {name} is too expensive for the allocated amount. Skipping.", stage="sizing", symbol=symbol)
+            return None
+
+        bracket_profit = bracket_stop = None
+        if bracket_mode:
+            instrument = prepared.index.get(symbol)
+            reason = instrument_index.bracket_ineligibility(instrument, profit_percent, loss_percent) if instrument else "not in equity.csv"
+            if reason is None:
+                bracket_profit = float(basket.profit_distance[rank])
+                bracket_stop = float(basket.stop_distance[rank])
+                if not bracket_profit or not bracket_stop:
+                    bracket_profit = bracket_stop = None
+                    reason = "target or stop distance rounds to zero ticks"
+            if reason is not None:
+                log_callback(f"--> {name}: {reason}. Using separate BUY, Stop-Loss and Target orders.", stage="bracket check", symbol=symbol)
+
+        return order_engine.OrderPlan(
+            rank=rank,
+            name=name,
+            symbol=symbol,
+            security_id=seq_id,
+            quantity=quantity,
+            stop_trigger=float(basket.stop_trigger[rank]),
+            stop_limit=float(basket.stop_limit[rank]),
+            target=float(basket.target[rank]),
+            bracket_profit=bracket_profit,
+            bracket_stop=bracket_stop,
+            price=float(basket.price[rank]),
+        )
 
-    def place_single_order(seq_id, price, amount, loss_percent, name, profit_percent, symbol):
-        """Places a single buy order followed by Stop-Loss and Target orders."""
+    def refresh_prices(seq_ids, symbols, prices):
+        """Swaps the scan prices for live LTPs from one batched quote request, if it answers within quote_budget."""
+        if not quote_budget:
+            return prices
+        # The gateway's own timeout is per socket read, so the budget is enforced on the whole call here.
+        executor = ThreadPoolExecutor(max_workers=1)
         try:
-            dhan = dhanhq(CLIENT_ID, ACCESS_TOKEN)
-            quantity = int(amount / price)
-            if quantity == 0:
-                log_callback(f"Stock {name} is too expensive for the allocated amount. Skipping.")
-                return 0
-            
-            log_callback(f"\nAttempting to place a BUY for {name} (Quantity: {quantity})")
-            response = dhan.place_order(
-                security_id=seq_id,
-                exchange_segment=dhan.NSE,
-                transaction_type=dhan.BUY,
-                quantity=quantity,
-                order_type=dhan.MARKET,
-                product_type=dhan.INTRA,
-                price=0
-            )
-            
-            log_callback(f"--> Buy Order Response for {name}: {response.get('status', 'N/A')}")
-            
-            if response and response.get("status") == "success":
-                s_loss = round_to_tick(price - price * (loss_percent / 100))
-                s_loss_bar = round_to_tick(price - price * ((loss_percent + 0.2) / 100))
-                s_profit = round_to_tick(price + price * (profit_percent / 100))
-
-                log_callback(f"Placing Stop-Loss for {name} at Trigger {s_loss}...")
-                sl_response = dhan.place_order(
-                    security_id=seq_id,
-                    exchange_segment=dhan.NSE,
-                    transaction_type=dhan.SELL,
-                    quantity=quantity,
-                    order_type=dhan.SL,
-                    product_type=dhan.INTRA,
-                    price=s_loss_bar,
-                    trigger_price=s_loss
-                )
-                if sl_response and sl_response.get("status") == "failure":
-                    log_callback(f"--> WARNING: Failed to place Stop-Loss for {name}. Please place it manually.")
-                else:
-                    log_callback(f"--> Stop-Loss placed successfully for {name}.")
-
-                log_callback(f"Placing Target for {name} at {s_profit}...")
-                profit_response = dhan.place_order(
-                    security_id=seq_id,
-                    exchange_segment=dhan.NSE,
-                    transaction_type=dhan.SELL,
-                    quantity=quantity,
-                    order_type=dhan.LIMIT,
-                    product_type=dhan.INTRA,
-                    price=s_profit
-                )
-                if profit_response and profit_response.get("status") == "failure":
-                    log_callback(f"--> WARNING: Failed to place Profit Target for {name}. Please place it manually.")
-                else:
-                    log_callback(f"--> Profit Target placed successfully for {name}.")
-            else:
-                log_callback(f"Buy order failed for {name}. Halting further orders for this stock.")
-            return 0
+            with prepared.tracer.span("quote"):
+                ltps = executor.submit(prepared.gateway.last_prices, seq_ids, quote_budget).result(timeout=quote_budget)
+        except FuturesTimeout:
+            log_callback(f"--> WARNING: Live quotes took longer than {quote_budget * 1000:.0f} ms. Sizing from scan prices.", stage="quote")
+            return prices
         except Exception as e:
-            log_callback(f"An unexpected error occurred while placing order for {name}: {e}")
-            return -1
+            # Best-effort: network errors and any unexpected reply shape alike fall back to the scan prices.
+            log_callback(f"--> WARNING: Live quotes unavailable ({type(e).__name__}: {e}). Sizing from scan prices.", stage="quote")
+            return prices
+        finally:
+            executor.shutdown(wait=False)
+
+        refreshed = []
+        for seq_id, symbol, price in zip(seq_ids, symbols, prices):
+            ltp = ltps.get(str(seq_id))
+            if ltp is None:
+                log_callback(f"--> WARNING: No live quote for {symbol}. Using the scan price {price}.", stage="quote", symbol=symbol)
+                ltp = price
+            refreshed.append(ltp)
+        log_callback(f"Refreshed {len(ltps)}/{len(seq_ids)} prices from live quotes.", stage="quote")
+        return refreshed
 
     def initiate_buy(seq_ids, names, prices, symbols):
-        """Uses a thread pool to place orders for multiple stocks concurrently."""
+        """Prices the whole basket at once and hands it to the async order engine, which respects the broker's rate limit."""
         if not no_of_stocks_to_buy or no_of_stocks_to_buy == 0:
             log_callback("Number of stocks to buy is zero. No trades will be placed.")
-            return
+            return []
             
         amount_per_stock = total_amount / no_of_stocks_to_buy
         log_callback(f"\nInitiating buys. Amount per stock: ₹{amount_per_stock:.2f}")
 
-        with ThreadPoolExecutor(max_workers=len(symbols)) as executor:
-            futures = [
-                executor.submit(place_single_order, seq_id, price, amount_per_stock, loss_percent, name, profit_percent, symbol)
-                for price, symbol, seq_id, name in zip(prices, symbols, seq_ids, names)
-            ]
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    log_callback(f"A trading thread failed with an error: {e}")
+        prices = refresh_prices(seq_ids, symbols, prices)
+        with prepared.tracer.span("pricing"):
+            instruments = [prepared.index.get(symbol) for symbol in symbols]
+            ticks = [instrument.tick_size if instrument and instrument.tick_size else pricing.DEFAULT_TICK for instrument in instruments]
+            lot_sizes = [instrument.lot_size if instrument and instrument.lot_size else 1 for instrument in instruments]
+            basket = pricing.price_basket(prices, amount_per_stock, profit_percent, loss_percent, ticks, lot_sizes)
+            plans = []
+            for rank, (symbol, seq_id, name) in enumerate(zip(symbols, seq_ids, names)):
+                plan = build_order_plan(rank, seq_id, name, symbol, basket)
+                if plan is not None:
+                    plans.append(plan)
+        record(store.record_plans, prepared.tracer.run_id, plans)
+        budget = amount_per_stock * len(symbols)
+        if budget > 0:
+            bought = basket.quantity > 0  # unpriced rows are NaN, and 0 x NaN would poison the sum
+            deployed = float((basket.quantity[bought] * basket.price[bought]).sum())
+            log_callback(f"Capital deployed: ₹{deployed:.2f} of ₹{budget:.2f} ({deployed / budget * 100:.1f}%)", stage="pricing")
+
+        # One limiter per account, so strategies running side by side share the broker's order rate.
+        limiter = order_engine.get_rate_limiter(CLIENT_ID, orders_per_second)
+        engine = order_engine.OrderEngine(prepared.gateway, log_callback, max_in_flight, orders_per_second, prepared.tracer,
+                                          prepared.tracker, store, limiter)
+        stats = engine.run(plans)
+        if stats.orders:
+            log_callback(f"\nOrder engine: {stats.summary()}", stage="orders")
+        return plans
 
     def get_seq_id(symbols):
-        """Retrieves Dhan security IDs from the local equity.csv file."""
-        try:
-            df = pd.read_csv('equity.csv', header=None, low_memory=False)
-        except FileNotFoundError:
-            log_callback("FATAL ERROR: equity.csv not found! Please place it in the application folder.")
+        """Retrieves Dhan security IDs from the compiled equity.csv instrument index."""
+        index = prepared.index
+        if index is None:
             return None
-            
-        filtered_df = df[(df[0] == 'NSE') & (df.apply(lambda row: 'EQ' in str(row.values), axis=1))]
+
         seq_ids = []
         for symbol in symbols:
-            # Find rows where the symbol is present
-            sub_filtered = filtered_df[filtered_df[1] == symbol]
-            if not sub_filtered.empty:
-                seq_ids.append(sub_filtered.iloc[0, 2])
+            seq_id = index.security_id(symbol)
+            if seq_id is not None:
+                seq_ids.append(seq_id)
             else:
-                log_callback(f"--> WARNING: Could not find security ID for symbol: {symbol}. It will be skipped.")
+                log_callback(f"--> WARNING: Could not find security ID for symbol: {symbol}. It will be skipped.", stage="get_seq_id", symbol=symbol)
         return seq_ids
 
-    def get_data(link, no_of_stocks):
+    def fetch_scan_http():
+        """Runs the Chartink scan over the pre-armed HTTP session and returns the results in memory."""
+        log_callback("Fetching scan results from Chartink over HTTP...")
+        with prepared.tracer.span("scan"):
+            content, content_type = prepared.chartink_session.fetch_raw()
+        with prepared.tracer.span("csv_parse"):
+            return chartink.parse_scan_response(content, content_type)
+
+    def fetch_scan_selenium(link):
         """Uses Selenium to download stock data from a Chartink screener."""
-        log_callback("Initializing browser to fetch data from Chartink...")
-        chromedriver_path = os.path.join(os.getcwd(), "drivers", "chromedriver.exe")
-        
-        if not os.path.exists(chromedriver_path):
-            log_callback(f"FATAL ERROR: chromedriver.exe not found in '{os.path.join(os.getcwd(), 'drivers')}'")
-            return None, None, None, None
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
 
-        options = webdriver.ChromeOptions()
-        # Run Chrome in "headless" mode so the user doesn't see a browser window
-        options.add_argument("--headless")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--window-size=1920,1080")
-        prefs = {"download.default_directory": os.getcwd(), "download.prompt_for_download": False, "directory_upgrade": True}
-        options.add_experimental_option("prefs", prefs)
-        
-        driver = None
+        driver = prepared.driver or open_browser(link, log_callback)
+        prepared.driver = None
+        if driver is None:
+            return None
+
+        scan_start = prepared.tracer.now_ms()
         try:
-            service = Service(chromedriver_path)
-            driver = webdriver.Chrome(service=service, options=options)
-            driver.get(link)
             log_callback("Running scan on Chartink...")
             WebDriverWait(driver, 20).until(EC.element_to_be_clickable((By.CLASS_NAME, 'run_scan_button'))).click()
             log_callback("Downloading CSV...")
             WebDriverWait(driver, 20).until(EC.element_to_be_clickable((By.XPATH, "//button[span[text()='CSV']]"))).click()
         except Exception as e:
             log_callback(f"FATAL ERROR during browser operation: {e}")
-            if driver:
-                driver.quit()
-            return None, None, None, None
+            driver.quit()
+            return None
 
         # Wait for the download to complete
         csv_filename = "NB 001 Buy, Technical Analysis Scanner.csv"
@@ -160,27 +301,84 @@ def run_trading_script(link, total_amount, profit_percent, loss_percent, no_of_s
             if os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
                 break
             time.sleep(0.1)
+        prepared.tracer.record("scan", scan_start, prepared.tracer.now_ms())
         
         driver.quit()
 
         if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
             log_callback("ERROR: CSV file was not downloaded or is empty. Check Chartink link and permissions.")
-            return None, None, None, None
+            return None
 
         log_callback("CSV downloaded. Processing data...")
-        df = pd.read_csv(csv_path)
+        with prepared.tracer.span("csv_parse"):
+            df = pd.read_csv(csv_path)
         os.remove(csv_path) # Clean up by deleting the downloaded file
+        return df
+
+    def pick_new_hits(df, no_of_stocks):
+        """Polling: takes the first `no_of_stocks` new hits that have a security ID.
+
+        A hit missing from the instrument index is skipped and the next one takes its slot, instead of
+        halting the poll. Hits are marked seen once their ID lookup is done, resolved or not, so later
+        polls neither retry them nor warn about them again. Picks stay seen even if they end up unaffordable.
+        """
+        index = prepared.index
+        if index is None:
+            log_callback("ERROR: The instrument index is not loaded. Halting.")
+            return None, None, None, None
+
+        seq_ids, names, symbols, prices = [], [], [], []
+        with prepared.tracer.span("get_seq_id"):
+            for symbol, name, price in zip(df.iloc[:, 2], df.iloc[:, 1], df.iloc[:, 5]):
+                if len(symbols) == no_of_stocks:
+                    break
+                seq_id = index.security_id(symbol)
+                seen_symbols.add(symbol)
+                if seq_id is None:
+                    log_callback(f"--> WARNING: Could not find security ID for symbol: {symbol}. It will be skipped.", stage="get_seq_id", symbol=symbol)
+                    continue
+                seq_ids.append(seq_id)
+                names.append(name)
+                symbols.append(symbol)
+                prices.append(price)
+
+        log_callback(f"Found {len(symbols)} stocks to trade: {', '.join(symbols)}")
+        return seq_ids, names, symbols, prices
+
+    def get_data(link, no_of_stocks):
+        """Fetches the screener results (HTTP first, Selenium as fallback) and resolves security IDs."""
+        df = None
+        if prepared.chartink_session is not None:
+            try:
+                df = fetch_scan_http()
+            except chartink.ChartinkError as e:
+                log_callback(f"--> WARNING: HTTP fetch failed ({e}). Falling back to the browser.")
+        if df is None:
+            df = fetch_scan_selenium(link)
+        if df is None:
+            return None, None, None, None
 
         if df.empty or df.shape[0] == 0:
             log_callback("No stocks found from the scan. The script will not place any trades.")
             return [], [], [], []
 
+        record(store.record_scan, prepared.tracer.run_id, df.iloc[:, 2], df.iloc[:, 1], df.iloc[:, 5])
+
+        if seen_symbols is not None:
+            hits = df.shape[0]
+            df = df[~df.iloc[:, 2].isin(seen_symbols)]
+            if df.empty:
+                log_callback(f"No new stocks in the scan ({hits} hits, all seen before).")
+                return [], [], [], []
+            return pick_new_hits(df, no_of_stocks)
+
         symbols = df.iloc[:no_of_stocks, 2].tolist()
         names = df.iloc[:no_of_stocks, 1].tolist()
         prices = df.iloc[:no_of_stocks, 5].tolist()
         
         log_callback(f"Found {len(symbols)} stocks to trade: {', '.join(symbols)}")
-        seq_ids = get_seq_id(symbols)
+        with prepared.tracer.span("get_seq_id"):
+            seq_ids = get_seq_id(symbols)
         
         # Check if we have a valid security ID for each symbol found
         if seq_ids is None or len(seq_ids) != len(symbols):
@@ -190,23 +388,49 @@ def run_trading_script(link, total_amount, profit_percent, loss_percent, no_of_s
         return seq_ids, names, symbols, prices
 
     # --- Main Execution Flow of the Script ---
+    status = "error"
+    plans = []
     try:
         log_callback("--- Starting Trading Script ---")
+        prearmed = prepared is not None
+        if not prearmed:
+            # Nothing was warmed up ahead of time, so the warm-up counts against the hot path.
+            prepared = prearm(link, CLIENT_ID, ACCESS_TOKEN, log_callback, fetch_mode, min(no_of_stocks_to_buy, max_in_flight),
+                              broker_url=broker_url, order_feed_url=order_feed_url)
+        tracer = prepared.tracer
+        tracer.attributes["link"] = link
+        if trigger_error is not None:
+            tracer.attributes["trigger_error_ms"] = trigger_error * 1000
+        run_start = tracer.now_ms() if prearmed else 0.0
+
         seq_ids, names, symbols, prices = get_data(link, no_of_stocks_to_buy)
         
         if seq_ids is None:
+             status = "halted"
              log_callback("Halting execution due to critical error during data fetching.")
-             return
+             return plans
         
         if not symbols:
+            status = "no symbols"
             log_callback("No symbols to process. Script finished.")
-            return
+            return plans
 
-        initiate_buy(seq_ids, names, prices, symbols)
+        with tracer.span("orders"):
+            plans = initiate_buy(seq_ids, names, prices, symbols)
+        tracer.record("run", run_start, tracer.now_ms())
+        status = "finished"
             
+        log_callback(f"\nHot path: {tracer.format(exclude=tracing.PREARM_PREFIX if prearmed else None)}", stage="summary")
+        if prearmed:
+            log_callback(f"Pre-arm moved {tracer.total_ms(tracing.PREARM_PREFIX):.0f} ms of warm-up out of the hot path.", stage="summary")
         log_callback("\n--- Trading Script Finished ---")
 
     except Exception as e:
         log_callback(f"\n--- A CRITICAL UNHANDLED ERROR OCCURRED: {e} ---")
         log_callback("--- Script execution has been terminated. ---")
-        
\ No newline at end of file
+    finally:
+        if prepared is not None:
+            if not keep_prepared:
+                prepared.close()
+            record(store.save_run, prepared.tracer, status)
+    return plans